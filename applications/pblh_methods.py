@@ -15,8 +15,8 @@ file_paths = [
 for file_path in file_paths[:5]:
     gdp = gp.read(file_path)
     gdp.data = gdp.data[gdp.data['alt'] <= 10000]  # Limit to first 10 km for speed
-    where = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Site.Name']['Value'].values[0]
-    when = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0]
+    where = gdp.attr('g.Site.Name')
+    when = gdp.attr('g.Measurement.StartTime')
     
     data=gp.parcel_method(gdp.data)
     data=gp.potential_temperature_gradient(gdp.data)
@@ -1,6 +1,5 @@
 import sys
 import os
-import pickle
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
 import numpy as np
@@ -128,10 +127,10 @@ def validate_ssm_fit(model, results, gdp, profile_id=None):
 # LOAD DATASET
 # =====================================================================
 
-pkl_path = r"applications\pblh_unc\pkls\gdp_2024_POT-RS-02_2024.pkl"
+# GDP store built by read_gdp_dataset.py, profiles are memory-mapped on access
+store_path = r"applications\pblh_unc\stores\gdp_2024_POT-RS-02_2024"
 
-with open(pkl_path, "rb") as f:
-    dataset = pickle.load(f)
+dataset = gp.open_store(store_path)
 
 print("Dataset Loaded")
 
@@ -147,8 +146,8 @@ for pid, gdp in tqdm(dataset.items()):
     upper_bound = gp._find_upper_bound(gdp.data[['alt']], upper_bound=3500, return_value=True)
     gdp.data = gdp.data[gdp.data['alt'] <= upper_bound]
 
-    where = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Site.Name']['Value'].values[0]
-    when = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0]
+    where = gdp.attr('g.Site.Name')
+    when = gdp.attr('g.Measurement.StartTime')
     when = when[0:10] + " " + when[11:19]
 
     # GRUAN PBLH
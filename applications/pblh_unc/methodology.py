@@ -7,7 +7,7 @@ import gruanpy as gp
 from ssm.statsmodels.pretrasformed_local_trend import PreTransformedLocalLinearTrend
 
 def fit_ssm(gdp, method='lbfgs', iterations=100):
-    data = gdp.data
+    data = gdp.upcast().data
 
     # -----------------------------
     # TIME
@@ -27,38 +27,39 @@ for f in result_files:
 # LOAD ALL RESULTS INTO ONE BIG DATAFRAME
 # ---------------------------------------------------------
 
-rows = []
+frames = []
 
 for file in result_files:
     with open(file, "rb") as f:
         results = pickle.load(f)
 
-    for pid, info in results.items():
+    pids = list(results)
+    infos = list(results.values())
 
-        pblh_info = info["pblh_info"]
-
-        for method in ["pm", "thv", "rh", "ri"]:
-            rows.append({
-                "pid": pid,
-                "site": info["where"],
-                "date": info["when"],
-                "tod": info["tod"],
-                "method": method,
+    # one column-built frame per method instead of one dict per (profile, method)
+    for method in ["pm", "thv", "rh", "ri"]:
+        pblh_info = [info["pblh_info"][method] for info in infos]
+        frames.append(pd.DataFrame({
+            "pid": pids,
+            "site": [info["where"] for info in infos],
+            "date": [info["when"] for info in infos],
+            "tod": [info["tod"] for info in infos],
+            "method": method,
 
-                # deterministic GRUAN value
-                "value": pblh_info[method]["value"],
+            # deterministic GRUAN value
+            "value": [p["value"] for p in pblh_info],
 
-                # MC statistics
-                "median": pblh_info[method]["median"],
-                "low": pblh_info[method]["low"],
-                "high": pblh_info[method]["high"],
-                "samples": pblh_info[method]["samples"],
+            # MC statistics
+            "median": [p["median"] for p in pblh_info],
+            "low": [p["low"] for p in pblh_info],
+            "high": [p["high"] for p in pblh_info],
+            "samples": [p["samples"] for p in pblh_info],
+        }))
 
-                # uncertainty width
-                "unc_width": pblh_info[method]["high"] - pblh_info[method]["low"],
-            })
+df = pd.concat(frames, ignore_index=True)
 
-df = pd.DataFrame(rows)
+# uncertainty width
+df["unc_width"] = df["high"] - df["low"]
 
 print("\nLoaded profiles:", df["pid"].nunique())
 print("Total rows:", len(df))
@@ -96,38 +97,19 @@ ymax = max(df["value"].max(), df["median"].max(), df["unc_width"].max())
 def compute_full_stats(df_site):
     df_clean = df_site.dropna(subset=["value", "median", "unc_width"], how="any")
 
-    rows = []
+    # median and IQR of every (method, tod) group in one grouped pass
+    quantiles = (
+        df_clean.groupby(["method", "tod"])[["value", "median", "unc_width"]]
+        .quantile([0.25, 0.5, 0.75])
+        .unstack()
+    )
+    stats = pd.DataFrame(index=quantiles.index)
+    for column, prefix in [("value", "value"), ("median", "mcm"), ("unc_width", "unc")]:
+        stats[f"{prefix}_median"] = quantiles[(column, 0.5)]
+        stats[f"{prefix}_IQR"] = quantiles[(column, 0.75)] - quantiles[(column, 0.25)]
 
-    for method in ["pm", "thv", "rh", "ri"]:
-        for tod in ["daytime", "twilight", "nighttime"]:
-            subset = df_clean[(df_clean["method"] == method) & (df_clean["tod"] == tod)]
-
-            if len(subset) == 0:
-                continue
-
-            def med_IQR(series):
-                s = series.dropna()
-                med = np.median(s)
-                q25 = np.percentile(s, 25)
-                q75 = np.percentile(s, 75)
-                return med, q75 - q25
-
-            val_med, val_IQR = med_IQR(subset["value"])
-            mcm_med, mcm_IQR = med_IQR(subset["median"])
-            unc_med, unc_IQR = med_IQR(subset["unc_width"])
-
-            rows.append({
-                "method": method,
-                "tod": tod,
-                "value_median": val_med,
-                "value_IQR": val_IQR,
-                "mcm_median": mcm_med,
-                "mcm_IQR": mcm_IQR,
-                "unc_median": unc_med,
-                "unc_IQR": unc_IQR
-            })
-
-    return pd.DataFrame(rows)
+    order = [(method, tod) for method in ["pm", "thv", "rh", "ri"] for tod in ["daytime", "twilight", "nighttime"]]
+    return stats.reindex([key for key in order if key in stats.index]).reset_index()
 
 # ---------------------------------------------------------
 # LOOP OVER SITES
@@ -9,27 +9,26 @@ import gruanpy as gp
 from applications.pblh_unc.methodology import *
 from tqdm import tqdm
 
-# Input pickle paths
-pkl_paths = [
-    r"applications\pblh_unc\pkls\gdp_2024_POT-RS-02_2024.pkl",
-    r"applications\pblh_unc\pkls\gdp_2024_POT-RS-01_2024.pkl",
-    r"applications\pblh_unc\pkls\gdp_2024_HKO-RS-01_2024.pkl",
-    r"applications\pblh_unc\pkls\gdp_2024_LAU-RS-02_2024.pkl",
-    r"applications\pblh_unc\pkls\gdp_2024_LIN-RS-01_2024.pkl"
+# Input GDP stores (built by read_gdp_dataset.py)
+store_paths = [
+    r"applications\pblh_unc\stores\gdp_2024_POT-RS-02_2024",
+    r"applications\pblh_unc\stores\gdp_2024_POT-RS-01_2024",
+    r"applications\pblh_unc\stores\gdp_2024_HKO-RS-01_2024",
+    r"applications\pblh_unc\stores\gdp_2024_LAU-RS-02_2024",
+    r"applications\pblh_unc\stores\gdp_2024_LIN-RS-01_2024"
 ]
 
-for pkl_path in pkl_paths:
+for store_path in store_paths:
 
-    # Load dataset
-    with open(pkl_path, "rb") as f:
-        dataset = pickle.load(f)
+    # Open dataset, profiles are memory-mapped on access
+    dataset = gp.open_store(store_path)
 
     print("-----" * 10)
-    print(f"Dataset: {pkl_path}")
+    print(f"Dataset: {store_path}")
 
     results_dict = {}
 
-    for pid, gdp in tqdm(dataset.items()):
+    for pid, gdp in tqdm(dataset.items(), total=len(dataset)):
 
         # Limit to first 3.5 km
         upper_bound = gp._find_upper_bound(
@@ -38,11 +37,11 @@ for pkl_path in pkl_paths:
         gdp.data = gdp.data[gdp.data['alt'] <= upper_bound]
 
         # Metadata
-        where = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Site.Name']['Value'].values[0]
-        when = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0]
+        where = gdp.attr('g.Site.Name')
+        when = gdp.attr('g.Measurement.StartTime')
         when = when[0:10] + " " + when[11:19]
         when_day = when[0:10]
-        tod = gdp.global_attrs[gdp.global_attrs['Attribute'] == "g.Measurement.TimeOfDay"]['Value'].values[0]
+        tod = gdp.attr("g.Measurement.TimeOfDay")
 
         data = gdp.data
 
@@ -141,7 +140,7 @@ for pkl_path in pkl_paths:
     # SAVE RESULTS FOR THIS PICKLE
     # -----------------------------------------
 
-    base = os.path.basename(pkl_path).replace(".pkl", "_pblh_results.pkl")
+    base = os.path.basename(store_path) + "_pblh_results.pkl"
     out_path = os.path.join("papers", "pblh_unc", base)
 
     with open(out_path, "wb") as f:
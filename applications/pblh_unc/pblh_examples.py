@@ -1,6 +1,5 @@
 import sys
 import os
-import pickle
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 import numpy as np
 import pandas as pd
@@ -28,35 +27,34 @@ SITE_TIMEZONES = {
 
 import re
 
-def extract_site_code(pkl_path):
+def extract_site_code(store_path):
     # Match pattern like "_LIN-" or "_HKO-" etc.
-    m = re.search(r"_(LIN|HKO|LAU|POT)-", pkl_path)
+    m = re.search(r"_(LIN|HKO|LAU|POT)-", store_path)
     if m:
         return m.group(1)
-    raise ValueError("Site code not found in pkl_path")
+    raise ValueError("Site code not found in store_path")
 
 
 
 # ---------------------------------------------------------
-# Specify the pickle file you want to load
+# Specify the GDP store you want to load (built by read_gdp_dataset.py)
 # ---------------------------------------------------------
-#pkl_path = r"applications\pblh_unc\pkls\gdp_2024_POT-RS-02_2024.pkl"
+#store_path = r"applications\pblh_unc\stores\gdp_2024_POT-RS-02_2024"
 
-#pkl_path = r"applications\pblh_unc\pkls\gdp_2024_POT-RS-01_2024.pkl"
+#store_path = r"applications\pblh_unc\stores\gdp_2024_POT-RS-01_2024"
 
-pkl_path=r'applications\pblh_unc\pkls\gdp_2024_HKO-RS-01_2024.pkl'
+store_path=r'applications\pblh_unc\stores\gdp_2024_HKO-RS-01_2024'
 
-pkl_path=r'applications\pblh_unc\pkls\gdp_2024_LAU-RS-02_2024.pkl'
+store_path=r'applications\pblh_unc\stores\gdp_2024_LAU-RS-02_2024'
 
-#pkl_path=r'applications\pblh_unc\pkls\gdp_2024_LIN-RS-01_2024.pkl'
+#store_path=r'applications\pblh_unc\stores\gdp_2024_LIN-RS-01_2024'
 
-site_code = extract_site_code(pkl_path)
+site_code = extract_site_code(store_path)
 
 # ---------------------------------------------------------
-# Load the dataset
+# Load the dataset, profiles are memory-mapped on access
 # ---------------------------------------------------------
-with open(pkl_path, "rb") as f:
-    dataset = pickle.load(f)
+dataset = gp.open_store(store_path)
 print('Dataset Loaded')
 # ---------------------------------------------------------
 # PBLH Analysis
@@ -70,8 +68,8 @@ for pid, gdp in tqdm(dataset.items()):
     print(f"\nProcessing profile: {pid}")
     upper_bound=gp._find_upper_bound(gdp.data[['alt']], upper_bound=3000, return_value=True) # find the PBLH upper bound for profile
     gdp.data = gdp.data[gdp.data['alt'] <= upper_bound]  # Limit to first 3.5 km
-    where = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Site.Name']['Value'].values[0] # location
-    when = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0] # time
+    where = gdp.attr('g.Site.Name') # location
+    when = gdp.attr('g.Measurement.StartTime') # time
     when=when[0:10]+' '+when[11:19]
     launch_time_utc = pd.to_datetime(gdp.data['time'].iloc[0], utc=True)
     site_code 
@@ -278,10 +276,10 @@ for pid, gdp in tqdm(dataset.items()):
     pblh_info["rh"]["samples"]  = df_sim["rh"].values
     pblh_info["ri"]["samples"]  = df_sim["ri"].values
 
-    where = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Site.Name']['Value'].values[0] # location
-    when = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0] # time
+    where = gdp.attr('g.Site.Name') # location
+    when = gdp.attr('g.Measurement.StartTime') # time
     when=when[0:10]
-    tod=gdp.global_attrs[gdp.global_attrs['Attribute'] == "g.Measurement.TimeOfDay"]['Value'].values[0] # time
+    tod=gdp.attr("g.Measurement.TimeOfDay") # time
 
     
     plot_ssm_diagnostics_with_violin(
@@ -1,4 +1,3 @@
-import pickle
 import pytz
 from datetime import datetime
 from collections import Counter
@@ -22,16 +21,12 @@ plt.rcParams.update({
 })
 
 # -----------------------------
-# 1. Load GDP dictionaries
+# 1. Open GDP stores
 # -----------------------------
 
-def load_pkl(path):
-    with open(path, "rb") as f:
-        return pickle.load(f)
-
-hko = load_pkl(r"applications/pblh_unc/pkls/gdp_2024_HKO-RS-01_2024.pkl")
-lau = load_pkl(r"applications/pblh_unc/pkls/gdp_2024_LAU-RS-02_2024.pkl")
-lin = load_pkl(r"applications/pblh_unc/pkls/gdp_2024_LIN-RS-01_2024.pkl")
+hko = gp.open_store(r"applications/pblh_unc/stores/gdp_2024_HKO-RS-01_2024")
+lau = gp.open_store(r"applications/pblh_unc/stores/gdp_2024_LAU-RS-02_2024")
+lin = gp.open_store(r"applications/pblh_unc/stores/gdp_2024_LIN-RS-01_2024")
 
 print("Loaded:")
 print("HKO:", len(hko))
@@ -54,20 +49,14 @@ SITE_TIMEZONES = {
 # -----------------------------
 
 def get_utc_time(gdp):
-    return gdp.global_attrs.loc[
-        gdp.global_attrs['Attribute'] == 'g.Measurement.StandardTime',
-        'Value'
-    ].values[0]
+    return gdp.attr('g.Measurement.StandardTime')
 
 # -----------------------------
 # 4. Extract GRUAN TimeOfDay
 # -----------------------------
 
 def get_time_of_day(gdp):
-    return gdp.global_attrs.loc[
-        gdp.global_attrs["Attribute"] == "g.Measurement.TimeOfDay",
-        "Value"
-    ].values[0]
+    return gdp.time_of_day
 
 # -----------------------------
 # 5. Convert UTC → local time
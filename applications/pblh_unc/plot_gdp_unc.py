@@ -35,8 +35,8 @@ for file_path in file_paths[:5]:
     gdp = gp.read(file_path)
     gdp.data = gdp.data[gdp.data['alt'] <= 2000]
     gdp.data = gdp.data[gdp.data['alt'] > 1800] 
-    where = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Site.Name']['Value'].values[0]
-    when = gdp.global_attrs[gdp.global_attrs['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0]
+    where = gdp.attr('g.Site.Name')
+    when = gdp.attr('g.Measurement.StartTime')
     when = when[:10] + ' ' + when[11:16]
     gdp.data = gdp.data[gdp.data.index % 3==0]
 
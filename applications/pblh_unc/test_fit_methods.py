@@ -1,6 +1,5 @@
 import numpy as np
 import pandas as pd
-import pickle
 import sys, os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -11,10 +10,9 @@ from tqdm import tqdm
 # ---------------------------------------------------------
 # Load dataset
 # ---------------------------------------------------------
-pkl_path = r"applications/pblh_unc/pkls/gdp_2024_POT-RS-02_2024.pkl"
+store_path = r"applications/pblh_unc/stores/gdp_2024_POT-RS-02_2024"
 
-with open(pkl_path, "rb") as f:
-    dataset = pickle.load(f)
+dataset = gp.open_store(store_path)
 
 print("Dataset Loaded:", len(dataset))
 
@@ -28,7 +26,7 @@ methods = ["lbfgs", "powell"]
 # ---------------------------------------------------------
 results_dict = {}
 
-for pid, gdp in tqdm(dataset.items()):
+for pid, gdp in tqdm(dataset.items(), total=len(dataset)):
 
     print(f"\nProcessing profile: {pid}")
 
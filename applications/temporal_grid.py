@@ -9,39 +9,35 @@ import gruanpy as gp
 import matplotlib.pyplot as plt
 from tqdm import tqdm
 
-# Need to download and unzip a folder with RS41 GDPs from GRUAN website
-gdp_folder=r'gdp\products_RS41-GDP-1_LIN_2017' # Path to the folder
-gdp_files = [os.path.join(gdp_folder, f) for f in os.listdir(gdp_folder) if f.endswith('.nc')]
-gdps=[]
-for file in tqdm(gdp_files[:10] , desc="Reading GDPs"):
-    gdps.append(gp.read(file))
+if __name__ == '__main__':  # read_many decodes the files in worker processes
+    # Need to download and unzip a folder with RS41 GDPs from GRUAN website
+    gdp_folder=r'gdp\products_RS41-GDP-1_LIN_2017' # Path to the folder
+    gdp_files = [os.path.join(gdp_folder, f) for f in os.listdir(gdp_folder) if f.endswith('.nc')]
+    gdps=list(tqdm(gp.read_many(gdp_files[:10]), total=len(gdp_files[:10]), desc="Reading GDPs"))
 
-# PARAMETERS
-TARGET_COLUMNS = ['temp']
-BIN_COLUMN = 'alt' # spatial bin in spatial gridding
-MANDATORY_LEVELS_FLAG = True
-LVL='mand_lvl' # spatial bin in temporal gridding
-if not MANDATORY_LEVELS_FLAG:
-    LVL = BIN_COLUMN+'_bin' # spatial bin in temporal gridding
+    # PARAMETERS
+    TARGET_COLUMNS = ['temp']
+    BIN_COLUMN = 'alt' # spatial bin in spatial gridding
+    MANDATORY_LEVELS_FLAG = True
+    LVL='mand_lvl' # spatial bin in temporal gridding
+    if not MANDATORY_LEVELS_FLAG:
+        LVL = BIN_COLUMN+'_bin' # spatial bin in temporal gridding
 
-# Variable Spatial Gridding
-ggds=[]
-for gdp in tqdm(gdps, desc="Spatial Gridding"):
-    ggd = gp.spatial_gridding(gdp, BIN_COLUMN, TARGET_COLUMNS, bin_size=100, mandatory_levels_flag=MANDATORY_LEVELS_FLAG)
-    ggds.append(ggd)
+    # Variable Spatial Gridding, all the profiles in one pass
+    ggds = gp.spatial_gridding_many(gdps, BIN_COLUMN, TARGET_COLUMNS, bin_size=100, mandatory_levels_flag=MANDATORY_LEVELS_FLAG)
 
-# Temporal Gridding
-tggd=gp.temporal_gridding(ggds, TARGET_COLUMNS, bin_size=7, lvl_column=LVL)
-print(tggd.data.head())
+    # Temporal Gridding
+    tggd=gp.temporal_gridding(ggds, TARGET_COLUMNS, bin_size=7, lvl_column=LVL)
+    print(tggd.data.head())
 
-# Plot temperature trend over time for each altitude
-unique_alts = tggd.data[LVL].unique()
-for alt in unique_alts[:10:]:
-    alt_data = tggd.data[tggd.data[LVL] == alt]
-    plt.plot(alt_data['time'], alt_data['temp'], label=alt)
-    plt.fill_between(alt_data['time'], alt_data['temp'] - alt_data['temp_uc'], alt_data['temp'] + alt_data['temp_uc'], alpha=0.2)
-plt.xlabel('Time')
-plt.ylabel('Temperature (K)')
-plt.legend()
-plt.title('Temperature Trend over Time for Each Altitude')
-plt.show()
+    # Plot temperature trend over time for each altitude
+    unique_alts = tggd.data[LVL].unique()
+    for alt in unique_alts[:10:]:
+        alt_data = tggd.data[tggd.data[LVL] == alt]
+        plt.plot(alt_data['time'], alt_data['temp'], label=alt)
+        plt.fill_between(alt_data['time'], alt_data['temp'] - alt_data['temp_uc'], alt_data['temp'] + alt_data['temp_uc'], alpha=0.2)
+    plt.xlabel('Time')
+    plt.ylabel('Temperature (K)')
+    plt.legend()
+    plt.title('Temperature Trend over Time for Each Altitude')
+    plt.show()
@@ -1,14 +1,90 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+def parse_gruan_time(value):
+    """
+    Parse a GRUAN timestamp (e.g. 2017-01-01T00:00:00.000Z) into a naive UTC datetime, None if missing.
+    """
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
 class GD:
     """
     General Data Model for GRUAN data.
     
     This class serves as a base for all GRUAN data models, providing a structure
     to hold metadata and data attributes.
+    Attributes are also held in the attrs dictionary, see attr(), and the most used
+    ones are parsed once into typed values (start_time, standard_time, site, product_id, time_of_day).
     """
     
     def __init__(self, metadata=None, data=None):
         self.metadata = metadata
         self.data = data
+        self._set_attrs()
     
     def __call__(self):
-        return self.data
\ No newline at end of file
+        return self.data
+
+    def __setstate__(self, state):
+        # objects pickled before attrs existed
+        self.__dict__.update(state)
+        if 'attrs' not in state:
+            self._set_attrs()
+
+    def _attrs_frame(self):
+        return self.metadata
+
+    def _set_attrs(self):
+        """
+        Build the attrs dictionary and the typed fields from the attributes table.
+        Call it again after editing the attributes table.
+        """
+        frame = self._attrs_frame()
+        self.attrs = dict(zip(frame['Attribute'], frame['Value'])) if frame is not None else {}
+        self.start_time = parse_gruan_time(self.attrs.get('g.Measurement.StartTime'))
+        self.standard_time = parse_gruan_time(self.attrs.get('g.Measurement.StandardTime'))
+        self.site = self.attrs.get('g.Site.Name')
+        self.product_id = self.attrs.get('g.Product.Id')
+        self.time_of_day = self.attrs.get('g.Measurement.TimeOfDay')
+
+    def attr(self, name, default=None):
+        """
+        Return the value of an attribute, e.g. attr('g.Measurement.StartTime').
+        """
+        return self.attrs.get(name, default)
+
+    def compact(self, exclude=()):
+        """
+        Reduce the memory of data in place: float64 columns are downcast to float32,
+        integer columns (flags, ids) to the smallest integer type and text columns to categoricals.
+        exclude (list): columns left untouched.
+        """
+        data = self.data
+        for col in data.columns:
+            if col in exclude:
+                continue
+            kind = data[col].dtype.kind
+            if data[col].dtype == np.float64:
+                data[col] = data[col].astype(np.float32)
+            elif kind in 'iu':
+                data[col] = pd.to_numeric(data[col], downcast='integer' if kind == 'i' else 'unsigned')
+            elif kind == 'O' and data[col].nunique() <= len(data) // 2:
+                data[col] = data[col].astype('category')
+        return self
+
+    def upcast(self, columns=None):
+        """
+        Upcast float32 columns back to float64 in place, before precision-sensitive computations.
+        columns (list): columns to upcast, defaults to every float32 column.
+        """
+        data = self.data
+        columns = columns if columns is not None else data.columns[data.dtypes == np.float32]
+        for col in columns:
+            data[col] = data[col].astype(np.float64)
+        return self
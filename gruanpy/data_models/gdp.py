@@ -5,9 +5,13 @@ class GDP(GD):
     General Data Model for GRUAN data products.
     
     Inherits from GD and adds functionality specific to data products.
+    attrs and attr() refer to the global attributes.
     """
     
     def __init__(self, global_attrs=None, data=None, variables_attrs=None, metadata=None):
-        super().__init__(metadata=metadata, data=data)
         self.global_attrs = global_attrs
-        self.variables_attrs = variables_attrs
\ No newline at end of file
+        self.variables_attrs = variables_attrs
+        super().__init__(metadata=metadata, data=data)
+
+    def _attrs_frame(self):
+        return self.global_attrs
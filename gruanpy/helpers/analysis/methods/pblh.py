@@ -8,6 +8,11 @@ class PBLHMethods:
     Each method implements a different criterion for determining the PBLH based on atmospheric data.
     """
 
+    def _as_float64(self, data):
+        # compact GDPs hold float32 columns, PBLH criteria are evaluated in float64
+        for col in data.columns[data.dtypes == np.float32]:
+            data[col] = data[col].astype(np.float64)
+
     def _find_upper_bound(self, data, upper_bound=3500, return_value=False):
         ground_level = data['alt'].min()
         self.altitude_bound = ground_level + upper_bound
@@ -21,6 +26,7 @@ class PBLHMethods:
         is equal to the surface value." Seidel et al. (2010)"
         """
         self._find_upper_bound(data)
+        self._as_float64(data)
         # computes missing variables if not present
         data['es']=FM.tetens_equation(data['temp']) if 'es' not in data else data['es']
         data['es_uc']=FM.saturation_vapor_pressure_uncertainty(data['temp'], data['temp_uc']) if 'es' not in data and propagate_uncertainty else None
@@ -50,6 +56,7 @@ class PBLHMethods:
         Vertical gradient is computed using finite differences.
         """
         self._find_upper_bound(data)
+        self._as_float64(data)
         # computes missing variables if not present
         if virtual:
             temp_clmn='virtual_theta'
@@ -80,6 +87,7 @@ class PBLHMethods:
         Vertical gradient is computed using finite differences.
         """
         self._find_upper_bound(data)
+        self._as_float64(data)
         data['rh_gradient'] = FM.finite_difference_gradient(data['rh'], data['alt'])
         data['rh_gradient_uc'] = FM.finite_difference_gradient_uncertainty(data['rh'], data['alt'], data['rh_uc'], data['alt_uc']) if 'rh_gradient_uc' not in data and propagate_uncertainty else None
         # apply criterion
@@ -95,6 +103,7 @@ class PBLHMethods:
         Vertical gradient is computed using finite differences.
         """
         self._find_upper_bound(data)
+        self._as_float64(data)
         # computes missing variables if not present
         data['es']=FM.tetens_equation(data['temp']) if 'es' not in data else data['es']
         data['es_uc']=FM.saturation_vapor_pressure_uncertainty(data['temp'], data['temp_uc']) if 'es' not in data and propagate_uncertainty else None
@@ -120,6 +129,7 @@ class PBLHMethods:
         """
 
         self._find_upper_bound(data)
+        self._as_float64(data)
 
         # --- Compute missing variables ---
         # saturation vapor pressure
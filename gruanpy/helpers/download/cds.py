@@ -0,0 +1,64 @@
+"""
+Structured requests to the Copernicus Climate Data Store (CDS).
+
+A request over a long period or many sites is split into chunks (one per month, year and/or site),
+each chunk is an ordinary CDS request retrieved into its own file. Files are named after a hash of
+the dataset and the chunk request, so a chunk already retrieved is found on disk and never requested
+again, also when it belongs to a different (e.g. longer) request.
+"""
+import hashlib
+import json
+import os
+import pandas as pd
+
+GRUAN_DATASET = 'insitu-observations-gruan-reference-network'
+
+# CDS request key used to select the sites
+SITE_KEY = 'station_name'
+
+# file extension of the CDS data formats
+EXTENSIONS = {'csv': 'csv', 'netcdf': 'nc', 'zip': 'zip'}
+
+CHUNKS = ['year', 'month', 'site']
+
+def build_requests(variables, start, end, sites=None, chunk=('month',), **extra):
+    """
+    Split a request into a list of CDS requests.
+    variables (list): CDS variable names.
+    start, end (str or datetime): date range, end excluded.
+    sites (list): station names, all the stations if None.
+    chunk (str or list): split by 'year', 'month' and/or 'site'. As in the CDS, a request covers all the
+        combinations of its years, months and days, so only monthly chunks match the date range exactly.
+    extra: other keys of the CDS request (e.g. data_format), copied in every chunk.
+    """
+    chunk = [chunk] if isinstance(chunk, str) else list(chunk or [])
+    assert set(chunk) <= set(CHUNKS), f"chunk must be made of {CHUNKS}"
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end)
+    if end <= start:
+        return []
+    days = pd.date_range(start, end, inclusive='left', freq='D')
+    periods = 'M' if 'month' in chunk else 'Y' if 'year' in chunk else None
+    groups = [group for _, group in days.to_series().groupby(days.to_period(periods))] if periods else [days]
+    site_groups = [[site] for site in sites] if sites and 'site' in chunk else [sites]
+    requests = []
+    for group in groups:
+        for site_group in site_groups:
+            request = {
+                'variable': sorted(variables),
+                'year': sorted({f'{d.year}' for d in group}),
+                'month': sorted({f'{d.month:02d}' for d in group}),
+                'day': sorted({f'{d.day:02d}' for d in group}),
+            }
+            if site_group:
+                request[SITE_KEY] = sorted(site_group)
+            request.update(extra)
+            requests.append(request)
+    return requests
+
+def request_path(folder, dataset, request):
+    """
+    Local file of a CDS request: <folder>/<dataset>_<hash of the request>.<extension>.
+    """
+    key = hashlib.sha1(json.dumps([dataset, request], sort_keys=True).encode()).hexdigest()[:16]
+    extension = EXTENSIONS.get(request.get('data_format', request.get('format')), 'data')
+    return os.path.join(folder, f'{dataset}_{key}.{extension}')
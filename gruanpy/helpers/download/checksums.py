@@ -0,0 +1,67 @@
+"""
+Checksum manifest of downloaded files.
+
+The manifest is a JSON file mapping each local file name to the size, mtime and sha256 of the copy
+that was downloaded. A file downloaded again with the same remote size and mtime must have the
+same checksum, otherwise the transfer is considered corrupted. verify() re-hashes the local files
+to detect copies damaged after the download.
+"""
+import hashlib
+import json
+import os
+import threading
+
+def sha256(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ChecksumManifest:
+    """
+    JSON manifest {file name: {'size', 'mtime', 'sha256'}}, safe to update from several threads.
+    path (str): manifest file, created on the first record.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def check(self, name, file_path, size, mtime):
+        """
+        Hash a downloaded file, raise ValueError if it differs from the recorded copy of the same
+        remote version, record it otherwise.
+        """
+        digest = sha256(file_path)
+        entry = self.entries.get(name)
+        if entry is not None and (entry['size'], entry['mtime']) == (size, mtime) and entry['sha256'] != digest:
+            raise ValueError(f"Checksum mismatch for {name}: expected {entry['sha256']}, got {digest}")
+        self.record(name, size, mtime, digest)
+        return digest
+
+    def record(self, name, size, mtime, digest):
+        with self._lock:
+            self.entries[name] = {'size': size, 'mtime': mtime, 'sha256': digest}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def verify(self, folder, names=None):
+        """
+        Re-hash the local files and return the names that are missing or do not match the manifest.
+        """
+        names = list(self.entries) if names is None else names
+        bad = []
+        for name in names:
+            file_path = os.path.join(folder, name)
+            if name not in self.entries or not os.path.exists(file_path) or sha256(file_path) != self.entries[name]['sha256']:
+                bad.append(name)
+        return bad
@@ -8,28 +8,106 @@ The class exploit the ftplib library to connect to the FTP server and download f
 
 See an example of usage to explore and download GDP from the NOAA FTP server in code_examples folder "download_gdp.py".
 
+Connections are kept open in a pool (see ftp_pool.py) and reused by all the methods.
+Downloads are incremental: a file whose local copy has the remote size and modification time is skipped,
+transfers are written to a .part file renamed once complete, and an interrupted transfer is resumed from
+where it stopped (FTP REST) if the remote file has kept the size and modification time recorded next to
+the .part file (.part.stat), otherwise it restarts from the beginning. Local copies get the remote modification time.
+
 Attributes:
     ftp_url (str): The URL of the FTP server. Defaults to "ftp.ncdc.noaa.gov".
     download_folder (str): The local folder where downloaded files will be stored. Defaults to "gdp".
+    ftp_port (int), ftp_user (str), ftp_passwd (str): Connection settings, anonymous login on port 21 by default.
+    pool_size (int): Maximum number of persistent FTP connections. Defaults to 4.
+    checksum_manifest (str): Optional path of a JSON manifest recording the sha256 of every downloaded file
+        (see checksums.py). Defaults to None (no checksum).
+    listing_cache_dir (str): Optional folder where directory listings are cached as JSON files, so that they
+        survive between sessions. Listings are always cached in memory. Defaults to None.
+    listing_ttl (float): Seconds after which a cached listing is refreshed. Defaults to 3600.
 
 Methods:
-    __init__(ftp_url="ftp.ncdc.noaa.gov", download_folder="gdp"):
+    __init__(ftp_url="ftp.ncdc.noaa.gov", download_folder="gdp", ftp_port=21, ftp_user="", ftp_passwd="", pool_size=4):
         Initializes the DM with the specified FTP URL and download folder.
 
-    search(ftp_dir_path):
-        Searches for files in the specified FTP directory.
+    search(ftp_dir_path, ttl=None):
+        Searches for files in the specified FTP directory, using the cached listing when it is recent enough.
         Args:
             ftp_dir_path (str): The path to the directory on the FTP server.
+            ttl (float): Maximum age in seconds of a cached listing, defaults to listing_ttl (0 forces a refresh).
         Returns:
             list: A list of filenames in the specified FTP directory.
 
-    download(ftp_dir_path, filename):
-        Downloads a file from the specified FTP directory to the local download folder.
+    download(ftp_dir_path, file_name, retries=0, backoff=1.0, force=False, remote_stat=None, local_folder=None):
+        Downloads a file from the specified FTP directory to the local download folder,
+        unless an up-to-date copy is already there.
         Args:
             ftp_dir_path (str): The path to the directory on the FTP server.
-            filename (str): The name of the file to download.
+            file_name (str): The name of the file to download.
+            retries (int): Number of retries of a transient error, waiting backoff * 2**attempt seconds in between.
+            backoff (float): Initial wait in seconds between retries.
+            force (bool): Download the file even if the local copy is up to date.
+            remote_stat (tuple): (size, mtime) of the remote file if already known, e.g. from a listing,
+                to skip the SIZE and MDTM round-trips.
+            local_folder (str): Folder of the local copy, defaults to download_folder.
         Returns:
-            None
+            str: The local path of the downloaded file.
+
+    fetch(ftp_dir_path, file_name, retries=3, backoff=1.0):
+        Downloads a file into memory, without writing it to disk.
+        Returns:
+            bytes: The content of the file.
+
+    fetch_many(ftp_dir_path, file_names, workers=None, ordered=True, prefetch=None, retries=3, backoff=1.0):
+        Lazily downloads many files into memory concurrently and yields (file name, bytes) pairs.
+        At most prefetch files (default 2*workers) are held in memory ahead of the consumer.
+
+    download_many(ftp_dir_path, file_names, workers=None, retries=3, backoff=1.0, force=False):
+        Downloads many files of an FTP directory concurrently over the pooled connections.
+        Transient errors are retried with exponential backoff, resuming the partial transfers.
+        Sizes and modification times are taken from one listing of the directory (MLSD) when the server supports it.
+        Args:
+            ftp_dir_path (str): The path to the directory on the FTP server.
+            file_names (list): The names of the files to download.
+            workers (int): Number of concurrent downloads, defaults to pool_size.
+        Returns:
+            dict: file name -> local path, or the exception raised by the last attempt.
+
+    walk(remote_root, ttl=None):
+        Yields (directory, file name, size, mtime) for every file below remote_root.
+        The tree is listed with MLSD (NLST when unsupported), one level at a time over the pooled connections,
+        and the listings are cached like in search. Without MLSD, directories are told from files with CWD
+        and the size and mtime of the files are None (download asks them for the files it transfers).
+
+    mirror(remote_root, pattern='*.nc', since=None, until=None, site=None, product=None, version=None, workers=None, ttl=None):
+        Keeps a local copy of a remote tree current: downloads into download_folder, with the same relative
+        layout, the files matching pattern that are missing or changed locally.
+        Args:
+            since, until (str or datetime): Launch time range of the GDPs (from their file name), until excluded.
+            site, product, version: GDP file name fields to keep, e.g. site='LIN', product='RS41-GDP' or 'RS41'.
+            Files not following the GRUAN naming convention are skipped when any of these filters is given.
+        Returns:
+            dict: remote path relative to remote_root -> local path, or the exception raised by the last attempt.
+
+    verify(file_names=None):
+        Re-hashes the local files and returns the ones missing or not matching the checksum manifest.
+
+    close():
+        Closes the pooled FTP connections.
+
+    cds_request(variables, start, end, sites=None, dataset=GRUAN_DATASET, chunk='month', workers=2, cache_dir=None, client=None, **extra):
+        Retrieves data from the Copernicus Climate Data Store, split in chunks (see cds.py) retrieved concurrently.
+        Chunks already on disk are not requested again.
+        Args:
+            variables (list): CDS variable names, e.g. ['air_temperature', 'relative_humidity'].
+            start, end (str or datetime): Date range, end excluded.
+            sites (list): Station names, all the stations if None.
+            chunk (str or list): Split by 'month', 'year' and/or 'site'.
+            workers (int): Number of chunks requested at the same time.
+            cache_dir (str): Folder of the retrieved files, defaults to <download_folder>/cds.
+            client: Object with a retrieve(dataset, request, target) method, defaults to cds_client or a cdsapi.Client().
+            extra: Other keys of the CDS request, e.g. data_format='csv'.
+        Returns:
+            list: The local paths of the chunks, in chronological order.
 
     execute_request(api_request):
         Executes a request string.
@@ -47,36 +125,304 @@ Methods:
         https://cds.climate.copernicus.eu/datasets/insitu-observations-gruan-reference-network?tab=overview
 """
 
-from ftplib import FTP
+from gruanpy.helpers.download.ftp_pool import FTPPool
+from gruanpy.helpers.download.checksums import ChecksumManifest
+from gruanpy.helpers.download.cds import GRUAN_DATASET, build_requests, request_path
+from gruanpy.helpers.parallel import bounded_map
+from gruanpy.helpers.read.catalog import parse_gdp_filename, _timestamp
+from functools import partial
+import calendar
+import fnmatch
+import ftplib
+import hashlib
+import json
 import os
+import time
+
+def _ftp_time(value):
+    # FTP timestamps (MDTM, MLSD modify fact) are UTC YYYYMMDDHHMMSS[.sss]
+    return calendar.timegm(time.strptime(value[:14], '%Y%m%d%H%M%S'))
+
+def _read_part_stat(part_path):
+    # [size, mtime] of the remote file a .part was taken from, recorded in a .part.stat sidecar
+    try:
+        with open(part_path + '.stat') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_part_stat(part_path, size, mtime):
+    with open(part_path + '.stat', 'w') as f:
+        json.dump([size, mtime], f)
+
+def _remove_part(part_path):
+    for path in [part_path, part_path + '.stat']:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _gdp_filter(file_name, since=None, until=None, site=None, product=None, version=None):
+    # match the fields of a GDP file name, files not following the GRUAN convention only pass without filters
+    if since is None and until is None and site is None and product is None and version is None:
+        return True
+    fields = parse_gdp_filename(file_name)
+    if fields is None:
+        return False
+    for column, value in [('site', site), ('version', version)]:
+        if value is not None and fields[column] not in ([value] if isinstance(value, (str, int)) else value):
+            return False
+    if product is not None:
+        products = [product] if isinstance(product, str) else product
+        if fields['product'] not in products and fields['instrument'] not in products:
+            return False
+    if since is not None and fields['start_time'] < _timestamp(since):
+        return False
+    if until is not None and fields['start_time'] >= _timestamp(until):
+        return False
+    return True
 
 class DownloadManager:
-    def __init__(self, ftp_url="ftp.ncdc.noaa.gov", download_folder="gdp"):
+    def __init__(self, ftp_url="ftp.ncdc.noaa.gov", download_folder="gdp", ftp_port=21, ftp_user="", ftp_passwd="", pool_size=4):
         self.ftp_url=ftp_url
         self.download_folder=download_folder
+        self.ftp_port=ftp_port
+        self.ftp_user=ftp_user
+        self.ftp_passwd=ftp_passwd
+        self.pool_size=pool_size
+        self.checksum_manifest=None
+        self.cds_client=None
+        self.listing_cache_dir=None
+        self.listing_ttl=3600
+        self._listings={}
+        self._pool=None
+        self._manifest=None
 
-    def search(self, ftp_dir_path=r'pub/data/gruan/processing'):
-        ftp = FTP(self.ftp_url, timeout=30)
-        ftp=FTP(self.ftp_url)
-        ftp.login()
-        ftp.cwd(ftp_dir_path)
-        files = ftp.nlst()
-        ftp.quit()
+    def _get_pool(self):
+        settings = (self.ftp_url, self.ftp_port, self.ftp_user, self.ftp_passwd, self.pool_size)
+        if self._pool is None or self._pool_settings != settings:
+            if self._pool is not None:
+                self._pool.close()
+            self._pool = FTPPool(self.ftp_url, self.ftp_port, self.ftp_user, self.ftp_passwd, size=self.pool_size)
+            self._pool_settings = settings
+        return self._pool
+
+    def _get_manifest(self):
+        if self.checksum_manifest is None:
+            return None
+        if self._manifest is None or self._manifest.path != self.checksum_manifest:
+            self._manifest = ChecksumManifest(self.checksum_manifest)
+        return self._manifest
+
+    def verify(self, file_names=None):
+        assert self.checksum_manifest is not None, "no checksum_manifest set"
+        return self._get_manifest().verify(self.download_folder, file_names)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
 
-        return files
-    
-    def download(self, ftp_dir_path, file_name):
+    def search(self, ftp_dir_path=r'pub/data/gruan/processing', ttl=None):
+        return sorted(self._list_dir(ftp_dir_path, ttl))
 
-        ftp = FTP(self.ftp_url, timeout=30)
-        ftp.login()
+    def _remote_stat(self, ftp, file_name):
+        # (size, mtime) of a remote file, None when the server does not support SIZE or MDTM
+        try:
+            ftp.voidcmd('TYPE I')
+            size = ftp.size(file_name)
+            mtime = _ftp_time(ftp.voidcmd(f'MDTM {file_name}')[4:].strip())
+        except ftplib.error_perm:
+            return None, None
+        return size, mtime
+
+    def _mlsd(self, ftp_dir_path, ftp):
+        # {name: [type, size, mtime]} of a remote directory, with one MLSD round-trip when supported
         ftp.cwd(ftp_dir_path)
-        
-        os.makedirs(self.download_folder, exist_ok=True)
-        local_file_path = os.path.join(self.download_folder, file_name)
-        with open(local_file_path, 'wb') as local_file:
-            ftp.retrbinary(f"RETR {file_name}", local_file.write)
-        
-        ftp.quit()
+        try:
+            return {
+                name: [facts.get('type'), int(facts['size']) if 'size' in facts else None,
+                       _ftp_time(facts['modify']) if 'modify' in facts else None]
+                for name, facts in ftp.mlsd(facts=['type', 'size', 'modify'])
+                if facts.get('type') in ['file', 'dir']
+            }
+        except ftplib.error_perm:
+            pass
+        # without MLSD one NLST lists the names, the kind, size and mtime of the entries are only asked
+        # when needed: walk tells the directories from the files, download asks SIZE and MDTM of its files
+        return {name.rsplit('/', 1)[-1]: [None, None, None] for name in ftp.nlst()}
+
+    def _probe_kinds(self, ftp_dir_path, names, ftp):
+        # 'dir' or 'file' of the entries of a directory listed without MLSD
+        kinds = {}
+        for name in names:
+            try:
+                ftp.cwd(f"{ftp_dir_path}/{name}")
+                ftp.cwd(ftp.home)
+                kinds[name] = 'dir'
+            except ftplib.error_perm:
+                kinds[name] = 'file'
+        return kinds
+
+    def _typed_listing(self, ftp_dir_path, ttl=None):
+        # cached listing whose entries all have a kind, the kinds probed are kept in the cached listing
+        entries = self._list_dir(ftp_dir_path, ttl)
+        unknown = [name for name, (kind, _, _) in entries.items() if kind is None]
+        if unknown:
+            for name, kind in self._get_pool().call(partial(self._probe_kinds, ftp_dir_path, unknown)).items():
+                entries[name][0] = kind
+        return entries
+
+    def _list_dir(self, ftp_dir_path, ttl=None):
+        # cached listing of a remote directory, refreshed when older than ttl seconds
+        ttl = self.listing_ttl if ttl is None else ttl
+        key = hashlib.sha1(f"{self.ftp_url}:{self.ftp_port}/{ftp_dir_path.strip('/')}".encode()).hexdigest()
+        cache_path = os.path.join(self.listing_cache_dir, key + '.json') if self.listing_cache_dir else None
+        cached = self._listings.get(key)
+        if cached is None and cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached = json.load(f)
+        if cached is not None and time.time() - cached['time'] < ttl:
+            return cached['entries']
+        cached = {'path': ftp_dir_path, 'time': time.time(), 'entries': self._get_pool().call(partial(self._mlsd, ftp_dir_path))}
+        self._listings[key] = cached
+        if cache_path:
+            os.makedirs(self.listing_cache_dir, exist_ok=True)
+            with open(cache_path + '.tmp', 'w') as f:
+                json.dump(cached, f)
+            os.replace(cache_path + '.tmp', cache_path)
+        return cached['entries']
+
+    def walk(self, remote_root, ttl=None):
+        dirs = [remote_root.rstrip('/')]
+        while dirs:
+            # list one level of the tree concurrently
+            listings = bounded_map(lambda d: (d, self._typed_listing(d, ttl)), dirs, self.pool_size, executor='thread')
+            dirs = []
+            for dir_path, entries in listings:
+                for name, (kind, size, mtime) in sorted(entries.items()):
+                    if kind == 'dir':
+                        dirs.append(f"{dir_path}/{name}")
+                    else:
+                        yield dir_path, name, size, mtime
+
+    def download(self, ftp_dir_path, file_name, retries=0, backoff=1.0, force=False, remote_stat=None, local_folder=None):
+        local_folder = local_folder or self.download_folder
+        os.makedirs(local_folder, exist_ok=True)
+        local_file_path = os.path.join(local_folder, file_name)
+        part_path = local_file_path + '.part'
+        def up_to_date(size, mtime):
+            if force or size is None or not os.path.exists(local_file_path):
+                return False
+            stat = os.stat(local_file_path)
+            return (stat.st_size, int(stat.st_mtime)) == (size, mtime)
+        if remote_stat and remote_stat[0] is not None and up_to_date(*remote_stat):
+            return local_file_path  # known from a listing, no connection needed
+        def retr(ftp):
+            ftp.cwd(ftp_dir_path)
+            size, mtime = remote_stat if remote_stat and remote_stat[0] is not None else self._remote_stat(ftp, file_name)
+            if up_to_date(size, mtime):
+                return False, size, mtime
+            # resume a previous partial transfer only if it was taken from the same version of the remote file
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if size is None or mtime is None or offset > size or _read_part_stat(part_path) != [size, mtime]:
+                offset = 0
+            if not offset:
+                _write_part_stat(part_path, size, mtime)
+            with open(part_path, 'ab' if offset else 'wb') as local_file:
+                ftp.retrbinary(f"RETR {file_name}", local_file.write, rest=offset or None)
+            if size is not None and os.path.getsize(part_path) != size:
+                _remove_part(part_path)
+                raise ftplib.error_temp(f"Incomplete transfer of {file_name}")
+            return True, size, mtime
+        transferred, size, mtime = self._get_pool().call(retr, retries, backoff)
+        if not transferred:
+            return local_file_path
+        manifest = self._get_manifest()
+        if manifest is not None:
+            try:
+                manifest.check(os.path.relpath(local_file_path, self.download_folder), part_path, size, mtime)
+            except ValueError:
+                _remove_part(part_path)
+                raise
+        os.replace(part_path, local_file_path)
+        _remove_part(part_path)
+        if mtime is not None:
+            os.utime(local_file_path, (mtime, mtime))
+        return local_file_path
+
+    def fetch(self, ftp_dir_path, file_name, retries=3, backoff=1.0):
+        chunks = []
+        def retr(ftp):
+            ftp.cwd(ftp_dir_path)
+            # a retried transfer resumes after the bytes already received
+            offset = sum(len(chunk) for chunk in chunks)
+            ftp.retrbinary(f"RETR {file_name}", chunks.append, rest=offset or None)
+        self._get_pool().call(retr, retries, backoff)
+        return b''.join(chunks)
+
+    def fetch_many(self, ftp_dir_path, file_names, workers=None, ordered=True, prefetch=None, retries=3, backoff=1.0):
+        yield from bounded_map(
+            lambda file_name: (file_name, self.fetch(ftp_dir_path, file_name, retries, backoff)),
+            file_names, workers or self.pool_size, 'thread', ordered, prefetch,
+        )
+
+    def download_many(self, ftp_dir_path, file_names, workers=None, retries=3, backoff=1.0, force=False):
+        listing = self._list_dir(ftp_dir_path, ttl=0)
+        results = bounded_map(
+            lambda file_name: self._try_download(ftp_dir_path, file_name, retries, backoff, force, listing.get(file_name, [None, None, None])[1:]),
+            file_names, workers or self.pool_size, executor='thread', ordered=False,
+        )
+        return dict(results)
+
+    def _try_download(self, ftp_dir_path, file_name, retries=3, backoff=1.0, force=False, remote_stat=None, local_folder=None, key=None):
+        try:
+            return key or file_name, self.download(ftp_dir_path, file_name, retries, backoff, force, remote_stat, local_folder)
+        except Exception as e:
+            return key or file_name, e
+
+    def mirror(self, remote_root=r'pub/data/gruan/processing', pattern='*.nc', since=None, until=None,
+               site=None, product=None, version=None, workers=None, retries=3, backoff=1.0, ttl=None):
+        matches = []
+        for dir_path, name, size, mtime in self.walk(remote_root, ttl):
+            if not fnmatch.fnmatch(name, pattern) or not _gdp_filter(name, since, until, site, product, version):
+                continue
+            relative = os.path.relpath(f"{dir_path}/{name}", remote_root.rstrip('/')).replace(os.sep, '/')
+            matches.append((dir_path, name, (size, mtime), relative))
+        results = bounded_map(
+            lambda m: self._try_download(m[0], m[1], retries, backoff, False, m[2],
+                                         os.path.join(self.download_folder, os.path.dirname(m[3])), m[3]),
+            matches, workers or self.pool_size, executor='thread', ordered=False,
+        )
+        return dict(results)
+
+    def _get_cds_client(self):
+        if self.cds_client is None:
+            try:
+                import cdsapi
+            except ImportError:
+                raise ImportError("cds_request needs cdsapi, install it with pip install cdsapi")
+            self.cds_client = cdsapi.Client()
+        return self.cds_client
+
+    def cds_request(self, variables, start, end, sites=None, dataset=GRUAN_DATASET, chunk='month',
+                    workers=2, cache_dir=None, client=None, **extra):
+        cache_dir = cache_dir or os.path.join(self.download_folder, 'cds')
+        os.makedirs(cache_dir, exist_ok=True)
+        client = client or self._get_cds_client()
+        requests = build_requests(variables, start, end, sites, chunk, **extra)
+        def retrieve(request):
+            target = request_path(cache_dir, dataset, request)
+            if not os.path.exists(target):
+                try:
+                    client.retrieve(dataset, request, target + '.part')
+                    os.replace(target + '.part', target)
+                except Exception as e:
+                    return e
+            return target
+        results = list(bounded_map(retrieve, requests, workers, executor='thread'))
+        # chunks retrieved before an error stay on disk and are reused by the next call
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+        return results
 
     def exec_request(self, api_request):
         assert isinstance(api_request, str), "api_request must be a string"
@@ -0,0 +1,98 @@
+"""
+Pool of persistent, logged-in FTP connections shared by the DownloadManager methods.
+
+Connections are opened lazily, at most size at a time, and reused across calls, so browsing and bulk
+downloads pay the connection and login round-trips once per connection instead of once per call.
+A connection that fails with a transient error (timeout, closed socket, 4xx reply) is dropped and
+replaced by a new one on the next request; permanent 5xx replies (e.g. file not found) leave it in the pool.
+"""
+import ftplib
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+class FTPPool:
+    def __init__(self, host, port=21, user='', passwd='', size=4, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login(self.user, self.passwd)
+        ftp.home = ftp.pwd()  # login directory, relative paths are resolved from here
+        return ftp
+
+    def _get(self):
+        while True:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            try:
+                ftp.voidcmd('NOOP')  # the server may have closed an idle connection
+                return ftp
+            except ftplib.all_errors:
+                self._discard(ftp)
+
+    def _discard(self, ftp):
+        try:
+            ftp.close()
+        except ftplib.all_errors:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection, positioned in the login directory: with pool.connection() as ftp: ...
+        """
+        self._slots.acquire()
+        ftp = None
+        try:
+            ftp = self._get()
+            ftp.cwd(ftp.home)
+            yield ftp
+        except ftplib.error_perm:
+            raise
+        except ftplib.all_errors:
+            if ftp is not None:
+                self._discard(ftp)
+                ftp = None
+            raise
+        finally:
+            if ftp is not None:
+                self._idle.put(ftp)
+            self._slots.release()
+
+    def call(self, fn, retries=3, backoff=1.0):
+        """
+        Run fn(ftp) on a pooled connection, retrying transient errors with exponential backoff.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as ftp:
+                    return fn(ftp)
+            except ftplib.error_perm:
+                raise
+            except ftplib.all_errors:
+                if attempt == retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+
+    def close(self):
+        while True:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                self._discard(ftp)
@@ -0,0 +1,172 @@
+"""
+Local disk cache of remote GDP files, addressed by URL (ftp://[user[:password]@]host[:port]/path/file.nc).
+
+On a miss the file is fetched through a DownloadManager (one per server, sharing its connection pool)
+and stored under a hash of its URL. The cache has a byte budget: once it is exceeded the least recently
+used files are evicted, except the pinned ones and the file just fetched, which is kept until the next
+eviction so that its path stays valid for the caller. A file can be pinned explicitly or automatically after
+pin_after hits, so that the profiles used most often on a shared worker are never fetched again.
+Hit counts and pins are kept in index.json in the cache folder.
+"""
+import hashlib
+import json
+import os
+import posixpath
+import threading
+from urllib.parse import urlparse, unquote
+from gruanpy.helpers.download.download_manager import DownloadManager
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def is_remote(path):
+    return isinstance(path, str) and path.startswith('ftp://')
+
+def fetch_url(url):
+    """
+    Download the content of an ftp:// URL into memory.
+    """
+    parsed = urlparse(url)
+    assert parsed.scheme == 'ftp', f"unsupported URL scheme: {url}"
+    settings = (parsed.hostname, parsed.port or 21, unquote(parsed.username or ''), unquote(parsed.password or ''))
+    with _managers_lock:
+        if settings not in _managers:
+            _managers[settings] = DownloadManager(settings[0], ftp_port=settings[1], ftp_user=settings[2], ftp_passwd=settings[3])
+        manager = _managers[settings]
+    dir_path, file_name = posixpath.split(unquote(parsed.path).lstrip('/'))
+    return manager.fetch(dir_path, file_name)
+
+class RemoteCache:
+    """
+    cache_dir (str): cache folder, created if missing.
+    max_bytes (int): byte budget of the unpinned files.
+    pin_after (int): pin a file after this number of hits, never if None.
+    fetch: callable returning the content of a URL, defaults to fetch_url.
+    """
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3, pin_after=None, fetch=fetch_url):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pin_after = pin_after
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def key(self, url):
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def path(self, url):
+        return os.path.join(self.cache_dir, self.key(url) + posixpath.splitext(urlparse(url).path)[1])
+
+    def _save_index(self):
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    def __contains__(self, url):
+        return os.path.exists(self.path(url))
+
+    def get(self, url):
+        """
+        Return the local path of a remote file, fetching it on a miss.
+        """
+        path = self.path(url)
+        if os.path.exists(path):
+            os.utime(path)  # mark as recently used
+            with self._lock:
+                entry = self.index.setdefault(self.key(url), {'url': url, 'hits': 0, 'pinned': False})
+                entry['hits'] += 1
+                if self.pin_after is not None and entry['hits'] >= self.pin_after:
+                    entry['pinned'] = True
+                self._save_index()
+            return path
+        content = self.fetch(url)
+        with open(path + '.part', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.part', path)
+        with self._lock:
+            self.index.setdefault(self.key(url), {'url': url, 'hits': 0, 'pinned': False})
+            self._save_index()
+        self.evict(keep=url)  # the file just fetched stays until the next eviction, even over budget
+        return path
+
+    def pin(self, url, fetch=True):
+        """
+        Keep a file in the cache regardless of the byte budget, fetching it now if fetch is True.
+        """
+        with self._lock:
+            self.index.setdefault(self.key(url), {'url': url, 'hits': 0, 'pinned': False})['pinned'] = True
+            self._save_index()
+        if fetch:
+            self.get(url)
+
+    def unpin(self, url):
+        with self._lock:
+            if self.key(url) in self.index:
+                self.index[self.key(url)]['pinned'] = False
+                self._save_index()
+        self.evict()
+
+    @property
+    def pinned(self):
+        return [entry['url'] for entry in self.index.values() if entry['pinned']]
+
+    def _entries(self):
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f == 'index.json' or f.endswith(('.part', '.tmp')):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, f))
+            except OSError:  # removed by a concurrent eviction
+                continue
+            key = posixpath.splitext(f)[0]
+            pinned = self.index.get(key, {}).get('pinned', False)
+            entries.append((stat.st_mtime, f, stat.st_size, pinned))
+        return entries
+
+    def size(self):
+        return sum(size for _, _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used unpinned files until they fit in max_bytes.
+        keep (str): URL of a file never removed, e.g. the one being returned by get.
+        """
+        kept = os.path.basename(self.path(keep)) if keep is not None else None
+        entries = sorted(entry for entry in self._entries() if not entry[3])
+        total = sum(size for _, _, size, _ in entries)
+        removed = []
+        for _, f, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if f == kept:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, f))
+            except OSError:
+                pass
+            removed.append(posixpath.splitext(f)[0])
+            total -= size
+        if removed:
+            with self._lock:
+                for key in removed:
+                    self.index.pop(key, None)
+                self._save_index()
+
+    def clear(self, pinned=False):
+        """
+        Remove all the cached files, the pinned ones only if pinned is True.
+        """
+        for _, f, _, is_pinned in self._entries():
+            if pinned or not is_pinned:
+                try:
+                    os.remove(os.path.join(self.cache_dir, f))
+                except OSError:
+                    pass
+                self.index.pop(posixpath.splitext(f)[0], None)
+        self._save_index()
@@ -0,0 +1,148 @@
+"""
+Streaming temporal gridding.
+
+A TemporalGridAccumulator keeps, for every (time bin, level), the sufficient statistics of the
+temporal gridding equations 3.12-3.18 (number of rows, sums and sums of squares of the values and
+of their uncertainty components) instead of the gridded profiles. Profiles can be pushed one at a
+time, accumulators built on different workers or years can be merged, and an accumulator can be
+saved and loaded, so network-wide climatologies can be computed map-reduce style.
+Accumulators to be merged must share target columns, bin size, level column and origin.
+"""
+import pickle
+import numpy as np
+import pandas as pd
+from gruanpy.data_models.gd import GD
+from gruanpy.helpers.grid.statistics import time_bins, sufficient_statistics, merge_statistics, temporal_equations
+
+def gridding_settings(settings):
+    return pd.DataFrame([('g.Gridding.' + name, value) for name, value in settings], columns=['Attribute', 'Value'])
+
+def gridding_metadata(global_attrs, settings):
+    # product and measurement attributes of the gridded data followed by the g.Gridding.<name> settings
+    if not isinstance(settings, pd.DataFrame):
+        settings = gridding_settings(settings)
+    metadata = global_attrs[global_attrs['Attribute'].str.contains('Product|Measurement', case=False)]
+    return pd.concat([metadata, settings], ignore_index=True)
+
+def profile_gds(binned_data, global_attrs, settings):
+    # split gridded rows keyed by profile position into one GD per profile
+    rows = binned_data.groupby('profile').indices
+    binned_data = binned_data.drop(columns='profile')
+    return [
+        GD(gridding_metadata(attrs, settings), binned_data.iloc[rows.get(i, [])].reset_index(drop=True))
+        for i, attrs in enumerate(global_attrs)
+    ]
+
+class TemporalGridAccumulator:
+    """
+    Accumulate spatially gridded GDs into the statistics of temporal_gridding.
+    target_columns (list), bin_size, lvl_column (str), origin: as in GriddingManager.temporal_gridding.
+    backend (str): engine of the grouped sums, see sufficient_statistics.
+    Usage:
+        acc = TemporalGridAccumulator(['temp'], 'month')
+        for ggd in ggds: acc.push(ggd)
+        acc.merge(other_acc).result()
+    """
+    buffer_size = 256  # pushed GDs are reduced to statistics in batches of buffer_size
+
+    def __init__(self, target_columns, bin_size, lvl_column='mand_lvl', origin='epoch', backend='pandas'):
+        self.target_columns = list(target_columns)
+        self.bin_size = bin_size
+        self.lvl_column = lvl_column
+        self.origin = origin
+        self.backend = backend
+        self.stats = None
+        self.ends = pd.Series(dtype='datetime64[ns]')  # end of each time bin, indexed by its start
+        self.metadata = pd.DataFrame(columns=['Attribute', 'Value'])
+        self.n_profiles = 0
+        self._pending = []
+
+    @property
+    def columns(self):
+        return [col + suffix for col in self.target_columns for suffix in ['', '_uc_ucor', '_uc_scor', '_uc_tcor']]
+
+    @property
+    def settings(self):
+        return (self.target_columns, str(self.bin_size), self.lvl_column, str(self.origin))
+
+    def push(self, ggds):
+        """
+        Add a spatially gridded GD, or an iterable of GDs, to the statistics.
+        """
+        for ggd in [ggds] if isinstance(ggds, GD) else ggds:
+            self._pending.append(ggd)
+            self.n_profiles += 1
+            if len(self._pending) >= self.buffer_size:
+                self._flush()
+        return self
+
+    def _statistics(self, ggds):
+        # sufficient statistics, time bin ends and metadata of a batch of GDs
+        columns = self.columns
+        stacked = {c: [] for c in [*columns, self.lvl_column, 'time']}
+        for ggd in ggds:
+            for c in [*columns, self.lvl_column]:
+                stacked[c].append(ggd.data[c].to_numpy(dtype=float))
+            stacked['time'].append(np.full(len(ggd.data), np.datetime64(ggd.start_time or 'NaT', 'ns')))
+        data = pd.DataFrame({c: np.concatenate(arrays) for c, arrays in stacked.items()})
+        starts, ends = time_bins(data['time'].to_numpy(dtype='datetime64[ns]'), self.bin_size, self.origin)
+        stats = sufficient_statistics(data, {'time_bin': starts, self.lvl_column: data[self.lvl_column]}, columns, self.backend)
+        metadata = pd.concat([ggd.metadata for ggd in ggds], ignore_index=True)
+        metadata = metadata[metadata['Attribute'].str.contains('Product|Measurement', case=False)]
+        return stats, pd.Series(ends, index=starts).groupby(level=0).first(), metadata
+
+    def _flush(self, others=()):
+        # merge the pushed GDs (one grouped pass for the whole batch) and other accumulators
+        parts = [self._statistics(self._pending)] if self._pending else []
+        parts += [(other.stats, other.ends, other.metadata) for other in others]
+        self._pending = []
+        if not parts:
+            return
+        stats, ends, metadata = zip(*parts)
+        self.stats = merge_statistics(self.stats, *stats)
+        ends = [e for e in [self.ends, *ends] if len(e)]
+        metadata = [m for m in [self.metadata, *metadata] if len(m)]
+        if ends:
+            self.ends = pd.concat(ends).groupby(level=0).first()
+        if metadata:
+            self.metadata = pd.concat(metadata, ignore_index=True)
+
+    def merge(self, *others):
+        """
+        Add the statistics of other accumulators (with the same settings) to this one and return it.
+        """
+        for other in others:
+            assert other.settings == self.settings, "accumulators with different settings cannot be merged"
+            other._flush()
+            self.n_profiles += other.n_profiles
+        self._flush(others)
+        return self
+
+    def result(self):
+        """
+        Return the temporally gridded GD of the accumulated profiles, see GriddingManager.temporal_gridding.
+        """
+        self._flush()
+        stats = self.stats
+        if stats is None:  # nothing pushed yet
+            stats = sufficient_statistics(pd.DataFrame({c: np.empty(0) for c in self.columns}), {
+                'time_bin': np.empty(0, dtype='datetime64[ns]'), self.lvl_column: np.empty(0)}, self.columns)
+        binned_data = temporal_equations(stats, self.target_columns)
+        starts = binned_data['time_bin'].to_numpy(dtype='datetime64[ns]')
+        binned_data.insert(2 + len(self.target_columns), 'time', starts + (self.ends.reindex(starts).to_numpy() - starts) / 2)
+        metadata = gridding_metadata(self.metadata, [
+            ('Type', 'Temporal Gridding'), ('BinSize', str(self.bin_size)), ('TargetColumns', ', '.join(self.target_columns))
+        ])
+        return GD(metadata, binned_data)
+
+    def save(self, path):
+        self._flush()
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            accumulator = pickle.load(f)
+        assert isinstance(accumulator, cls), f"{path} does not contain a {cls.__name__}"
+        return accumulator
@@ -0,0 +1,130 @@
+"""
+Dense profile cube: many profiles interpolated onto one vertical grid.
+
+The rows of all the profiles are stacked in one array sorted by (profile, coordinate), and every grid
+point of every profile is located with a single searchsorted on a (profile, coordinate) key, so the
+linear interpolation of all the variables is a few array operations. Grid points outside a profile
+are NaN, no extrapolation is done.
+
+Uncertainties are propagated through the interpolation weights w and 1 - w: the uncorrelated
+component (_uc_ucor) in quadrature, the correlated ones (_uc_scor, _uc_tcor) linearly. The total
+uncertainty (_uc) is recombined from the components, or interpolated as correlated when a profile
+has no components.
+"""
+import numpy as np
+import xarray as xr
+
+UNCERTAINTIES = ['_uc_ucor', '_uc_scor', '_uc_tcor', '_uc']
+
+def cube_variables(variables, uncertainties=True):
+    """
+    Return the variables of the cube, each followed by its uncertainty components and total.
+    """
+    return [var + suffix for var in variables for suffix in [''] + (UNCERTAINTIES if uncertainties else [])]
+
+def interpolation_weights(coords, profile, grid, n_profiles):
+    """
+    Locate every grid point in every profile.
+    coords, profile (array): coordinate and profile number of the rows, sorted by (profile, coordinate),
+        without missing coordinates.
+    grid (array): increasing grid coordinates.
+    n_profiles (int): number of profiles, including those without rows.
+    Returns the (profile, level) arrays of the rows below and above each grid point, the weight of
+    the row above, and the mask of the grid points inside their profile.
+    """
+    starts = np.searchsorted(profile, np.arange(n_profiles))
+    ends = np.searchsorted(profile, np.arange(n_profiles), side='right')
+    if not len(coords):
+        empty = np.zeros((n_profiles, len(grid)), dtype=int)
+        return empty, empty, np.zeros(empty.shape), np.zeros(empty.shape, dtype=bool)
+    shift = min(coords.min(), grid.min())
+    scale = 2 * (max(coords.max(), grid.max()) - shift) + 1  # profile keys do not overlap
+    keys = profile * scale + (coords - shift)
+    grid_keys = np.arange(n_profiles)[:, None] * scale + (grid - shift)[None, :]
+    position = np.searchsorted(keys, grid_keys, side='right')
+    start, end = starts[:, None], ends[:, None]
+    last = len(coords) - 1
+    lower = np.clip(position - 1, start, np.maximum(end - 2, start)).clip(max=last)
+    upper = np.clip(lower + 1, None, np.maximum(end - 1, start)).clip(max=last)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        width = coords[upper] - coords[lower]
+        weight = np.where(width > 0, (grid[None, :] - coords[lower]) / width, 0.0)
+    first, final = coords[start.clip(max=last)], coords[(end - 1).clip(min=0)]
+    inside = (end > start) & (grid[None, :] >= first) & (grid[None, :] <= final)
+    return lower, upper, weight, inside
+
+def interpolate_profiles(gdps, grid, variables, grid_column='alt', log=None, uncertainties=True):
+    """
+    Interpolate GDPs onto a common grid, see GriddingManager.to_cube.
+    """
+    log = grid_column == 'press' if log is None else log
+    grid = np.asarray(grid, dtype=float)
+    outputs = cube_variables(variables, uncertainties)
+    stacked = {c: [] for c in [grid_column, *outputs, 'profile']}
+    profiles = {c: [] for c in ['product_id', 'site', 'time_of_day', 'time']}
+    n_profiles = 0
+    for i, gdp in enumerate(gdps):
+        n = len(gdp.data)
+        for c in [grid_column, *outputs]:
+            if c in gdp.data.columns:
+                stacked[c].append(gdp.data[c].to_numpy(dtype=float))
+            elif c == grid_column or not c.endswith(tuple(UNCERTAINTIES)):
+                raise KeyError(f"Column {c} missing from GDP {gdp.product_id}")
+            else:  # missing uncertainty, _uc is recombined from the components
+                stacked[c].append(np.full(n, np.nan))
+        stacked['profile'].append(np.full(n, i))
+        profiles['product_id'].append(gdp.product_id or '')
+        profiles['site'].append(gdp.site or '')
+        profiles['time_of_day'].append(gdp.time_of_day or '')
+        profiles['time'].append(np.datetime64(gdp.start_time or 'NaT', 'ns'))
+        n_profiles += 1
+    data = {c: np.concatenate(arrays) if arrays else np.empty(0) for c, arrays in stacked.items()}
+
+    # sort the rows by (profile, coordinate) and locate the grid points
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coords = np.log(data[grid_column]) if log else data[grid_column]
+        grid_coords = np.log(grid) if log else grid
+    rows = np.flatnonzero(~np.isnan(coords))
+    rows = rows[np.lexsort((coords[rows], data['profile'][rows]))]
+    order = np.argsort(grid_coords)
+    lower, upper, weight, inside = interpolation_weights(coords[rows], data['profile'][rows], grid_coords[order], n_profiles)
+
+    cube = np.full((n_profiles, len(grid), len(outputs)), np.nan)
+    for k, c in enumerate(outputs):
+        values = data[c][rows]
+        if not len(values):
+            continue
+        below, above = values[lower], values[upper]
+        if c.endswith('_uc_ucor'):  # uncorrelated, in quadrature
+            cube[:, order, k] = np.sqrt(((1 - weight) * below)**2 + (weight * above)**2)
+        else:  # values and correlated uncertainties, linearly
+            cube[:, order, k] = (1 - weight) * below + weight * above
+    cube[:, order, :] = np.where(inside[..., None], cube[:, order, :], np.nan)
+    if uncertainties:
+        for var in variables:
+            ucor, scor, tcor, uc = (outputs.index(var + suffix) for suffix in UNCERTAINTIES)
+            components = cube[..., ucor]**2 + np.nan_to_num(cube[..., scor])**2 + np.nan_to_num(cube[..., tcor])**2
+            cube[..., uc] = np.where(np.isnan(cube[..., ucor]), cube[..., uc], np.sqrt(components))
+
+    return xr.DataArray(
+        cube, dims=('profile', 'level', 'variable'), name='cube',
+        coords={
+            'level': grid, 'variable': outputs,
+            **{c: ('profile', np.array(values, dtype='datetime64[ns]' if c == 'time' else object)) for c, values in profiles.items()},
+        },
+        attrs={'level_column': grid_column, 'interpolation': 'log' if log else 'linear'},
+    )
+
+def save_cube(cube, path):
+    """
+    Save a cube as NetCDF (contiguous, memory-mappable variable) or as Zarr if path ends with .zarr.
+    """
+    if str(path).rstrip('/').endswith('.zarr'):
+        try:
+            import zarr  # noqa: F401
+        except ImportError:
+            raise ImportError("zarr is required to save cubes as Zarr (pip install zarr)")
+        cube.to_dataset().to_zarr(path, mode='w')
+    else:
+        dataset = cube.to_dataset()
+        dataset.to_netcdf(path, encoding={'cube': {'contiguous': True}})
@@ -0,0 +1,72 @@
+"""
+Spatio-temporal gridding of whole archives with dask.
+
+The files are partitioned by site and month (from their GRUAN file names). One dask task per
+partition reads its files, grids them spatially and pushes them into a TemporalGridAccumulator.
+The accumulators are then merged in a tree reduction: merging sums their sufficient statistics, so
+the temporal equations 3.12-3.18 applied to the merged accumulator give the same result as
+temporal_gridding on all the profiles at once. The graph runs on any dask scheduler: threads,
+processes, or a dask.distributed Client (local cluster or multi-node scheduler). See GriddingManager.grid_archive.
+"""
+import os
+from gruanpy.helpers.read.catalog import parse_gdp_filename
+from gruanpy.helpers.read.reading_manager import _read_file
+from gruanpy.helpers.grid.accumulator import TemporalGridAccumulator
+
+PARTITIONS = ['site', 'year', 'month']
+
+def partition_files(file_paths, by=('site', 'month')):
+    """
+    Group files by site, year and/or month of their file name, returns {key tuple: [paths]}.
+    Files not following the GRUAN naming convention are grouped under None values.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    assert set(by) <= set(PARTITIONS), f"partitions must be made of {PARTITIONS}"
+    partitions = {}
+    for path in file_paths:
+        fields = parse_gdp_filename(os.path.basename(path))
+        start = fields['start_time'] if fields else None
+        values = {
+            'site': fields['site'] if fields else None,
+            'year': start[:4] if start else None,
+            'month': start[:7] if start else None,
+        }
+        partitions.setdefault(tuple(values[name] for name in by), []).append(path)
+    return partitions
+
+def grid_partition(file_paths, spatial_kwargs, temporal_kwargs, read_kwargs=None, settings=None):
+    """
+    Read, spatially grid and accumulate the files of one partition, returns a TemporalGridAccumulator.
+    spatial_kwargs (dict): arguments of GriddingManager.spatial_gridding_many.
+    temporal_kwargs (dict): arguments of TemporalGridAccumulator, its backend is also used by the spatial gridding.
+    """
+    from gruanpy.helpers.grid.gridding_manager import GriddingManager  # imports this module lazily
+    accumulator = TemporalGridAccumulator(**temporal_kwargs)
+    manager = GriddingManager()
+    manager.gridding_backend = accumulator.backend
+    gdps = (_read_file(path, read_kwargs or {}, settings) for path in file_paths)
+    return accumulator.push(manager.spatial_gridding_many(gdps, **spatial_kwargs))
+
+def default_scheduler():
+    """
+    Return the active dask.distributed Client, or 'processes' when there is none: netCDF decoding is
+    serialized between the threads of a process, the threaded scheduler would read one file at a time.
+    """
+    try:
+        from distributed import default_client
+        return default_client()
+    except (ImportError, ValueError):
+        return 'processes'
+
+def merge_accumulators(*accumulators):
+    return accumulators[0].merge(*accumulators[1:])
+
+def tree_reduce(tasks, split_every=8):
+    """
+    Merge delayed accumulators split_every at a time until one is left.
+    """
+    from dask import delayed
+    tasks = list(tasks)
+    while len(tasks) > 1:
+        tasks = [delayed(merge_accumulators)(*tasks[i:i + split_every]) for i in range(0, len(tasks), split_every)]
+    return tasks[0]
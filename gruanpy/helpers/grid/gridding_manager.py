@@ -1,13 +1,18 @@
+import numpy as np
 import pandas as pd
+import xarray as xr
 from gruanpy.data_models.gd import GD
-from datetime import datetime
+from gruanpy.helpers.grid.statistics import nearest_levels, regular_bins, sufficient_statistics, spatial_equations
+from gruanpy.helpers.grid.accumulator import TemporalGridAccumulator, gridding_settings, gridding_metadata, profile_gds
+from gruanpy.helpers.grid.pyramid import GriddingPyramid
+from gruanpy.helpers.grid.cube import interpolate_profiles, save_cube
 pass
 class GriddingManager:
     """
     A class to grid observation in regular vertical space intervals, or temporal intervals.
     """
     def __init__(self):
-        pass
+        self.gridding_backend = 'pandas'  # engine of the grouped sums: 'pandas', 'arrow' or 'polars'
 
     def _mandatory_levels(self):
         # Mandatory levels in mb (Millibars) = hPa (Hectopascals) https://glossary.ametsoc.org/wiki/Mandatory_level
@@ -17,100 +22,238 @@ class GriddingManager:
         ]  
         return lvls
     
-    def spatial_gridding(self, gdp, bin_column, target_columns, bin_size=100, mandatory_levels_flag=True): #TN-13
-        # bin_size is ignore if mandatory_levels_flag is True
-        assert bin_column in ['alt', 'press'] 
-
-        # spatial gridding
-        data=gdp.data
-        bin = bin_column+'_bin'
-        if mandatory_levels_flag:
-            bin_lvl = 'mand_lvl'
-            data[bin_lvl] = data['press'].apply(
-                lambda x: min(self._mandatory_levels(), key=lambda lvl: abs(lvl - x)) #python crazy syntax to select the nearest lvl
-            )
-            lvls_mean = data.groupby(bin_lvl)[bin_column].mean().to_dict()
-            data[bin] = data[bin_lvl].apply(lambda x: lvls_mean[x])
-            binned_data = data.groupby(bin_lvl)[target_columns].mean().reset_index() # 3.5
-            binned_data[bin_column] = binned_data[bin_lvl].apply(lambda x: lvls_mean[x])
-
-        else:
-            data[bin] = (data[bin_column] // bin_size) * bin_size + bin_size / 2
-            binned_data = data.groupby(bin)[target_columns].mean().reset_index() # 3.5
-            bin_mean = data.groupby(bin)[bin_column].mean().to_dict()
-            binned_data[bin_column] = binned_data[bin].apply(lambda x: bin_mean[x])
-        
-        for col in target_columns:
-            binned_data[col + '_uc_ucor_avg'] = data.groupby(bin)[col + '_uc_ucor'].apply(
-                        lambda x: (((x**2).sum())**0.5)/len(x)
-                        ).reset_index(drop=True) #3.6
-            binned_data[col + '_var'] = data.groupby(bin)[col].apply(
-                        lambda x: (((x-x.mean())**2).sum()/(len(x)*(len(x)-1)))**0.5
-                        ).reset_index(drop=True) #3.7
-            binned_data[col + '_uc_ucor'] = (
-                binned_data[col+'_uc_ucor_avg']**2 + binned_data[col + '_var']**2)**0.5 #3.8
-            if col+'_uc_scor' in data.columns:
-                binned_data[col + '_uc_scor'] = data.groupby(bin)[col + '_uc_scor'].mean().reset_index(drop=True) #3.9
-            else:
-                binned_data[col + '_uc_scor']=0
-            if col+'_uc_tcor' in data.columns:
-                binned_data[col + '_uc_tcor'] = data.groupby(bin)[col + '_uc_tcor'].mean().reset_index(drop=True) #3.10
-            else:
-                binned_data[col + '_uc_tcor']=0
-            binned_data[col+'_uc']=(binned_data[col+'_uc_ucor']**2 + binned_data[col+'_uc_scor']**2 + binned_data[col+'_uc_tcor']**2)**0.5 #3.11
+    def spatial_gridding(self, gdp, bin_column, target_columns, bin_size=100, mandatory_levels_flag=True, levels=None, level_column='press'): #TN-13
+        """
+        Grid a GDP in vertical bins (equations 3.5-3.11), gdp.data is not modified.
+        Bins are the mandatory levels (nearest press level, key 'mand_lvl') if mandatory_levels_flag is True,
+        the given levels of level_column (nearest level, key 'lvl') if levels is not None,
+        regular bins of bin_size along bin_column (key '<bin_column>_bin') otherwise.
+        """
+        # bin_size is ignore if mandatory_levels_flag is True or levels are given
+        assert bin_column in ['alt', 'press']
+        data = gdp.data
+        key, keys = self._spatial_bins(data, bin_column, bin_size, mandatory_levels_flag, levels, level_column)
+        stats = sufficient_statistics(data, {key: keys}, self._statistics_columns(data, bin_column, target_columns), self.gridding_backend)
+        binned_data = spatial_equations(stats, bin_column, target_columns)
 
         # add metadata
-        metadata = gdp.global_attrs[gdp.global_attrs['Attribute'].str.contains('Product|Measurement', case=False)]
-        metadata = metadata._append({'Attribute': 'g.Gridding.Type', 'Value': 'Spatial Gridding'}, ignore_index=True)
-        metadata = metadata._append({'Attribute': 'g.Gridding.BinColumn', 'Value': bin_column}, ignore_index=True)
-        metadata = metadata._append({'Attribute': 'g.Gridding.BinSize', 'Value': str(bin_size)}, ignore_index=True)
-        metadata = metadata._append({'Attribute': 'g.Gridding.TargetColumns', 'Value': ', '.join(target_columns)}, ignore_index=True)
+        metadata = gridding_metadata(gdp.global_attrs, self._spatial_settings(bin_column, target_columns, bin_size))
 
         ggd=GD(metadata, binned_data)
         return ggd
-    
-    def temporal_gridding(self, ggds, target_columns, bin_size, lvl_column='mand_lvl'):
-        # merge data from all ggds in a single table
-        data=pd.DataFrame()
-        for ggd in ggds:
-            start_time_str = ggd.metadata[ggd.metadata['Attribute'] == 'g.Measurement.StartTime']['Value'].values[0]
-            start_time = datetime.strptime(start_time_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-            ggd_data = ggd.data.copy()
-            ggd_data['time'] = start_time
-            data = pd.concat([data, ggd_data], ignore_index=True)
 
-        # temporal gridding
-        bin='time_bin'
-        data[bin] = (data['time'].dt.day // bin_size) * bin_size + bin_size / 2 # TOBEFIXED Fassò: rendi possibile aggragazione per mese o anno consistente nel tempo
-        first_data = data['time'].min()
-        
-        binned_data = data.groupby([bin, 'mand_lvl'])[target_columns].mean().reset_index() # 3.12
-        #binned_data['mand_lvl'] = data.groupby([bin])['mand_lvl'].apply(lambda x: x).reset_index(drop=True)
-        binned_data['time'] = first_data + pd.to_timedelta(binned_data[bin], unit='D')
+    def spatial_gridding_many(self, gdps, bin_column, target_columns, bin_size=100, mandatory_levels_flag=True, levels=None, level_column='press', as_table=False):
+        """
+        Grid many GDPs at once: the profiles are stacked in one table with a profile key and gridded
+        in a single grouped pass, giving the same results as spatial_gridding on each GDP.
+        gdps (iterable): GDPs, e.g. a list or the generator returned by read_many. Their data is not modified.
+        as_table (bool): return one tidy DataFrame with the profile position and product_id of each bin
+            instead of a list of GDs (one per GDP, in input order).
+        """
+        assert bin_column in ['alt', 'press']
+        key = self._spatial_key(bin_column, mandatory_levels_flag, levels)
+        columns = self._statistics_columns(None, bin_column, target_columns)
+        stacked = {c: [] for c in [*columns, key, 'profile']}
+        attrs, product_ids = [], []
+        for i, gdp in enumerate(gdps):
+            n = len(gdp.data)
+            for c in columns:
+                if c in gdp.data.columns:
+                    stacked[c].append(gdp.data[c].to_numpy(dtype=float))
+                elif c.endswith(('_uc_scor', '_uc_tcor')):  # missing correlated components count as 0
+                    stacked[c].append(np.zeros(n))
+                else:
+                    raise KeyError(f"Column {c} missing from GDP {gdp.product_id}")
+            stacked[key].append(self._spatial_bins(gdp.data, bin_column, bin_size, mandatory_levels_flag, levels, level_column)[1])
+            stacked['profile'].append(np.full(n, i))
+            attrs.append(gdp.global_attrs)
+            product_ids.append(gdp.product_id)
+        data = pd.DataFrame({c: np.concatenate(arrays) if arrays else np.empty(0) for c, arrays in stacked.items()})
+        stats = sufficient_statistics(data, {'profile': data['profile'], key: data[key]}, columns, self.gridding_backend)
+        binned_data = spatial_equations(stats, bin_column, target_columns)
+
+        if as_table:
+            binned_data.insert(1, 'product_id', np.array(product_ids, dtype=object)[binned_data['profile'].to_numpy(dtype=int)])
+            return binned_data
+        settings = gridding_settings(self._spatial_settings(bin_column, target_columns, bin_size))
+        return profile_gds(binned_data, attrs, settings)
+
+    def gridding_pyramid(self, gdps, bin_column, target_columns, cell_size=None, log=None):
+        """
+        Compute the fine-cell statistics of GDPs once, then grid them at any bin size with regrid.
+        gdps (iterable): GDPs, e.g. a list or the generator returned by read_many.
+        cell_size (float), log (bool): fine cells, 10 m for alt and 0.001 ln(hPa) for press by default.
+        Usage:
+            pyramid = gp.gridding_pyramid(gdps, 'alt', ['temp', 'rh'])
+            for bin_size in [50, 100, 200]:
+                ggds = pyramid.regrid(bin_size)
+        """
+        pyramid = GriddingPyramid(bin_column, target_columns, cell_size, log, self._mandatory_levels(), self.gridding_backend)
+        return pyramid.push(gdps)
+
+    def to_cube(self, gdps, grid, variables, grid_column='alt', log=None, uncertainties=True, path=None):
+        """
+        Interpolate GDPs linearly onto a common vertical grid and return them as one xarray.DataArray
+        with dimensions (profile, level, variable), backed by a contiguous float array.
+        grid (array): values of grid_column ('alt' or 'press') of the levels.
+        variables (list): columns to interpolate, e.g. ['temp', 'rh'].
+        log (bool): interpolate in ln(grid_column), defaults to True for press.
+        uncertainties (bool): add <var>_uc_ucor (propagated as uncorrelated), <var>_uc_scor and
+            <var>_uc_tcor (propagated as correlated) and the total <var>_uc after each variable.
+        path (str): also save the cube, as Zarr if path ends with .zarr and as NetCDF otherwise.
+        Profiles are coordinated by product_id, site, time_of_day and time (launch time), levels
+        outside a profile are NaN. Usage:
+            cube = gp.to_cube(gdps, np.arange(0, 30000, 50), ['temp', 'rh'])
+            cube.sel(variable='temp').groupby('time.month').mean('profile')
+        """
+        assert grid_column in ['alt', 'press']
+        cube = interpolate_profiles(gdps, grid, variables, grid_column, log, uncertainties)
+        if path is not None:
+            save_cube(cube, path)
+        return cube
+
+    def _spatial_settings(self, bin_column, target_columns, bin_size):
+        return [('Type', 'Spatial Gridding'), ('BinColumn', bin_column), ('BinSize', str(bin_size)), ('TargetColumns', ', '.join(target_columns))]
+
+    def _spatial_key(self, bin_column, mandatory_levels_flag, levels=None):
+        return 'lvl' if levels is not None else 'mand_lvl' if mandatory_levels_flag else bin_column + '_bin'
+
+    def _spatial_bins(self, data, bin_column, bin_size, mandatory_levels_flag, levels=None, level_column='press'):
+        # name and value of the bin of each row
+        key = self._spatial_key(bin_column, mandatory_levels_flag, levels)
+        if levels is not None:
+            return key, nearest_levels(data[level_column], levels)
+        if mandatory_levels_flag:
+            return key, nearest_levels(data['press'], self._mandatory_levels())
+        return key, regular_bins(data[bin_column], bin_size)
+
+    def _statistics_columns(self, data, bin_column, target_columns):
+        # columns entering the gridding equations, the correlated components missing from data count as 0
+        columns = [bin_column]
         for col in target_columns:
-            binned_data[col + '_uc_ucor_avg'] = data.groupby([bin,'mand_lvl'])[col + '_uc_ucor'].apply(
-                        lambda x: (((x**2).sum())**0.5)/len(x)
-                        ).reset_index(drop=True) #3.13
-            binned_data[col + '_var'] = data.groupby([bin,'mand_lvl'])[col].apply(
-                        lambda x: ((((x-x.mean())**2).sum())/(len(x)*max((len(x)-1),1)))**0.5
-                        ).reset_index(drop=True) #3.14
-            binned_data[col + '_uc_sc']=data.groupby([bin,'mand_lvl'])[col + '_uc_scor'].apply(
-                        lambda x: (((x**2).sum())**0.5)/len(x)
-                        ).reset_index(drop=True) #3.15
-            binned_data[col + '_uc_ucor']=(
-                binned_data[col+'_uc_ucor_avg']**2 + binned_data[col + '_var']**2 + binned_data[col + '_uc_sc']**2)**0.5 #3.16
-            binned_data[col + '_cor']=data.groupby([bin,'mand_lvl'])[col + '_uc_tcor'].mean().reset_index(drop=True) #3.17
-            binned_data[col+'_uc']=(
-                binned_data[col+'_uc_ucor']**2 + binned_data[col+'_cor']**2)**0.5 #3.18
-        
-        # add metadata
-        metadata = pd.DataFrame()
-        for ggd in ggds:
-            ggd_metadata = ggd.metadata[ggd.metadata['Attribute'].str.contains('Product|Measurement', case=False)]
-            metadata = pd.concat([metadata, ggd_metadata], ignore_index=True)
-        metadata = metadata._append({'Attribute': 'g.Gridding.Type', 'Value': 'Temporal Gridding'}, ignore_index=True)
-        metadata = metadata._append({'Attribute': 'g.Gridding.BinSize', 'Value': str(bin_size)}, ignore_index=True)
-        metadata = metadata._append({'Attribute': 'g.Gridding.TargetColumns', 'Value': ', '.join(target_columns)}, ignore_index=True)
-        
-        ggd=GD(metadata, binned_data)
-        return ggd
\ No newline at end of file
+            columns += [col, col + '_uc_ucor'] + [col + c for c in ['_uc_scor', '_uc_tcor'] if data is None or col + c in data.columns]
+        return list(dict.fromkeys(columns))
+    
+    def spatial_gridding_archive(self, archive, bin_column, target_columns, bin_size=100, mandatory_levels_flag=True, bin_range=None):
+        """
+        Lazy spatial gridding of every profile of an archive opened with read_archive.
+        Returns an xarray.Dataset with dimensions (profile, bin) holding the columns of spatial_gridding,
+        one dask task grids one chunk of profiles and nothing is computed until the result is loaded.
+        bin_range (tuple): range covered by the regular bins when mandatory_levels_flag is False,
+            defaults to (0, 40000) m for alt and (0, 1100) hPa for press.
+        """
+        import dask.array as da
+        assert bin_column in ['alt', 'press']
+        if mandatory_levels_flag and 'press' not in archive.variables:
+            raise KeyError("mandatory levels need the press variable, open the archive with it or set mandatory_levels_flag=False")
+        if mandatory_levels_flag:
+            bins = np.sort(self._mandatory_levels()).astype(float)
+        else:
+            lower, upper = bin_range or {'alt': (0, 40000), 'press': (0, 1100)}[bin_column]
+            bins = (np.arange(lower, upper, bin_size) // bin_size) * bin_size + bin_size / 2
+        columns = [c for c in dict.fromkeys([bin_column] + (['press'] if mandatory_levels_flag else []) + [
+            col + suffix for col in target_columns for suffix in ['', '_uc_ucor', '_uc_scor', '_uc_tcor']
+        ]) if c in archive.variables]
+        outputs = [bin_column] + [
+            col + suffix for col in target_columns
+            for suffix in ['', '_uc_ucor_avg', '_var', '_uc_ucor', '_uc_scor', '_uc_tcor', '_uc']
+        ]
+        subset = archive[columns].reset_coords([c for c in columns if c in archive.coords])
+        subset = subset.drop_vars([c for c in subset.coords if c != 'level'])
+        subset = subset.chunk({'level': -1})  # a block must hold whole profiles to grid them
+        n_profiles, profile_chunks = subset.sizes['profile'], subset.chunks['profile']
+        template = xr.Dataset(
+            {name: (('profile', 'bin'), da.empty((n_profiles, len(bins)), chunks=(profile_chunks, len(bins))))
+             for name in outputs},
+            coords={'bin': bins},
+        )
+        gridded = xr.map_blocks(
+            self._grid_profiles, subset, template=template,
+            kwargs=dict(bin_column=bin_column, target_columns=target_columns, bin_size=bin_size,
+                        mandatory_levels_flag=mandatory_levels_flag, bins=bins, outputs=outputs),
+        )
+        profile_coords = [c for c in ['product_id', 'site', 'time_of_day', 'start_time'] if c in archive.coords]
+        return gridded.assign_coords({c: archive[c] for c in profile_coords})
+
+    def _grid_profiles(self, block, bin_column, target_columns, bin_size, mandatory_levels_flag, bins, outputs):
+        # map_blocks worker: grid all the profiles of the block in one pass and place them on the fixed bins
+        values = {name: np.full((block.sizes['profile'], len(bins)), np.nan) for name in outputs}
+        block = block.transpose('profile', 'level')
+        data = pd.DataFrame({c: block[c].values.ravel() for c in block.data_vars})
+        data['profile'] = np.repeat(np.arange(block.sizes['profile']), block.sizes['level'])
+        data = data.dropna(subset=[bin_column])  # padding of the shorter profiles
+        if data.empty:
+            return xr.Dataset({name: (('profile', 'bin'), array) for name, array in values.items()}, coords={'bin': bins})
+        key, keys = self._spatial_bins(data, bin_column, bin_size, mandatory_levels_flag)
+        stats = sufficient_statistics(data, {'profile': data['profile'], key: keys}, self._statistics_columns(data, bin_column, target_columns), self.gridding_backend)
+        binned_data = spatial_equations(stats, bin_column, target_columns)
+        keys = binned_data[key].to_numpy(dtype=float)
+        position = np.clip(np.searchsorted(bins, keys), 1, len(bins) - 1)
+        position -= (keys - bins[position - 1]) < (bins[position] - keys)  # nearest bin
+        on_grid = np.isclose(bins[position], keys)
+        profile = binned_data['profile'].to_numpy()[on_grid]
+        for name in outputs:
+            values[name][profile, position[on_grid]] = binned_data[name].to_numpy(dtype=float)[on_grid]
+        return xr.Dataset({name: (('profile', 'bin'), array) for name, array in values.items()}, coords={'bin': bins})
+
+    def temporal_gridding(self, ggds, target_columns, bin_size, lvl_column='mand_lvl', origin='epoch'):
+        """
+        Grid spatially gridded GDs in time bins (equations 3.12-3.18), each GD counting at its launch time.
+        bin_size: number of days (int), calendar bin ('day', 'week', 'month', 'season', 'year') or a pandas
+            offset alias (e.g. '10D', '2W-MON'). Calendar bins never fold different months or years together.
+        lvl_column (str): spatial bin column of the GDs, e.g. 'mand_lvl' or 'alt_bin'.
+        origin: start of the first bin of fixed-length bins, 'epoch', 'start' or a timestamp.
+        Rows are keyed by time_bin (start of the bin) and lvl_column, time is the center of the bin.
+        """
+        return self.temporal_accumulator(target_columns, bin_size, lvl_column, origin).push(ggds).result()
+
+    def temporal_accumulator(self, target_columns, bin_size, lvl_column='mand_lvl', origin='epoch'):
+        """
+        Return an empty TemporalGridAccumulator: push spatially gridded GDs one at a time (or in batches),
+        merge accumulators computed elsewhere, save/load them, and get the temporal_gridding result.
+        """
+        return TemporalGridAccumulator(target_columns, bin_size, lvl_column, origin, self.gridding_backend)
+
+    def grid_archive(self, paths_or_folder, bin_column, target_columns, time_bin_size, bin_size=100, mandatory_levels_flag=True, levels=None,
+                     partition_by=('site', 'month'), by_site=False, scheduler=None, split_every=8, origin='epoch', as_accumulator=False, **read_kwargs):
+        """
+        Spatially and temporally grid a whole archive of GDP files with dask.
+        Files are partitioned by site and month, each partition is read and gridded by one task and
+        the partial temporal statistics are merged in a tree reduction, see temporal_gridding.
+        bin_column, target_columns, bin_size, mandatory_levels_flag, levels: as in spatial_gridding.
+        time_bin_size, origin: bin_size and origin of temporal_gridding.
+        partition_by (list): 'site', 'year' and/or 'month'.
+        by_site (bool): grid every site separately and return {site: GD}, instead of one GD of the network.
+        scheduler: dask scheduler, e.g. 'processes', 'threads' or a dask.distributed Client, defaults to the
+            active Client (the one created last), or to worker processes since the netCDF decoding is
+            serialized between threads.
+        as_accumulator (bool): return the merged TemporalGridAccumulators instead of the GDs, e.g. to
+            add the next months later.
+        read_kwargs: forwarded to read (variables, alt_min, alt_max, ...).
+        Needs the file listing of ReadingManager, as in GRUANpy.
+        Usage:
+            from dask.distributed import Client
+            client = Client('tcp://scheduler:8786')
+            climatology = gp.grid_archive('gdp/', 'press', ['temp'], 'month', scheduler=client)
+        """
+        try:
+            import dask
+        except ImportError:
+            raise ImportError("dask is required to grid archives (pip install 'dask[distributed]')")
+        from gruanpy.helpers.grid.dask_gridding import partition_files, grid_partition, tree_reduce, default_scheduler
+        partition_by = [partition_by] if isinstance(partition_by, str) else list(partition_by)
+        assert not by_site or 'site' in partition_by, "by_site needs partitions by site"
+        spatial_kwargs = dict(bin_column=bin_column, target_columns=target_columns, bin_size=bin_size,
+                              mandatory_levels_flag=mandatory_levels_flag, levels=levels)
+        temporal_kwargs = dict(target_columns=target_columns, bin_size=time_bin_size, origin=origin, backend=self.gridding_backend,
+                               lvl_column=self._spatial_key(bin_column, mandatory_levels_flag, levels))
+        groups = {}
+        for key, file_paths in partition_files(self._list_files(paths_or_folder), partition_by).items():
+            task = dask.delayed(grid_partition)(file_paths, spatial_kwargs, temporal_kwargs, read_kwargs, self._settings())
+            groups.setdefault(key[partition_by.index('site')] if by_site else None, []).append(task)
+        accumulators = dask.compute({group: tree_reduce(tasks, split_every) for group, tasks in groups.items()},
+                                    scheduler=scheduler or default_scheduler())[0]
+        if not by_site:
+            accumulators = accumulators.get(None, TemporalGridAccumulator(**temporal_kwargs))
+            return accumulators if as_accumulator else accumulators.result()
+        return accumulators if as_accumulator else {site: accumulator.result() for site, accumulator in accumulators.items()}
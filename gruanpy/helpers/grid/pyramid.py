@@ -0,0 +1,161 @@
+"""
+Multi-resolution spatial gridding.
+
+A GriddingPyramid keeps, for every profile, the sufficient statistics of the spatial gridding
+equations 3.5-3.11 on fine cells of the bin column (e.g. 10 m of altitude, or 0.001 of ln(hPa)).
+Since sufficient statistics are additive, any coarser regular bin made of whole cells is obtained by
+summing adjacent cells and the uncertainty equations are applied last: trying another bin size does
+not read or group the 1 s data again. Results are identical to spatial_gridding when bin_size is a
+multiple of the cell size. Nearest-level bins (e.g. mandatory levels) are made of the cells whose
+centre is nearest to each level, so their edges are exact to within half a cell.
+"""
+import pickle
+import numpy as np
+import pandas as pd
+from gruanpy.data_models.gdp import GDP
+from gruanpy.helpers.grid.statistics import nearest_levels, sufficient_statistics, combine_statistics, merge_statistics, spatial_equations
+from gruanpy.helpers.grid.accumulator import gridding_settings, profile_gds
+
+# default cell size of each bin column, in m of altitude and in ln(hPa) (about 10 m near the ground)
+CELL_SIZES = {'alt': 10, 'press': 0.001}
+
+class GriddingPyramid:
+    """
+    Fine-cell sufficient statistics of many profiles.
+    bin_column (str): 'alt' or 'press'.
+    target_columns (list): columns that can be gridded, with their uncertainty components.
+    cell_size (float): size of the fine cells, defaults to CELL_SIZES[bin_column].
+    log (bool): cells regular in ln(bin_column) instead of bin_column, defaults to True for press.
+    levels (list): levels used by regrid when mandatory_levels_flag is True.
+    backend (str): engine of the grouped sums, see sufficient_statistics.
+    Usage:
+        pyramid = GriddingPyramid('alt', ['temp']).push(gdps)
+        pyramid.regrid(100), pyramid.regrid(50)
+    """
+    buffer_size = 256  # pushed GDPs are reduced to statistics in batches of buffer_size
+
+    def __init__(self, bin_column, target_columns, cell_size=None, log=None, levels=None, backend='pandas'):
+        assert bin_column in ['alt', 'press']
+        self.bin_column = bin_column
+        self.target_columns = list(target_columns)
+        self.cell_size = cell_size or CELL_SIZES[bin_column]
+        self.log = bin_column == 'press' if log is None else log
+        self.levels = levels
+        self.backend = backend
+        self.stats = None
+        self.global_attrs = []
+        self.product_ids = []
+        self._pending = []
+
+    @property
+    def columns(self):
+        columns = [self.bin_column] + [col + suffix for col in self.target_columns for suffix in ['', '_uc_ucor', '_uc_scor', '_uc_tcor']]
+        return list(dict.fromkeys(columns))
+
+    @property
+    def n_profiles(self):
+        return len(self.product_ids)
+
+    def cells(self, values):
+        """
+        Return the index of the cell containing each value of the bin column.
+        """
+        values = np.asarray(values, dtype=float)
+        if self.log:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.log(values)
+        return np.floor(values / self.cell_size)
+
+    def _coordinates(self, values):
+        # bin column values of cell scale values
+        return np.exp(values) if self.log else values
+
+    def push(self, gdps):
+        """
+        Add a GDP, or an iterable of GDPs, to the pyramid. The GDPs are numbered in push order.
+        """
+        for gdp in [gdps] if isinstance(gdps, GDP) else gdps:
+            self._pending.append(gdp)
+            self.global_attrs.append(gdp.global_attrs)
+            self.product_ids.append(gdp.product_id)
+            if len(self._pending) >= self.buffer_size:
+                self._flush()
+        return self
+
+    def _flush(self):
+        # one grouped pass over the (profile, cell) of the pending GDPs
+        if not self._pending:
+            return
+        first = self.n_profiles - len(self._pending)
+        stacked = {c: [] for c in [*self.columns, 'profile']}
+        for i, gdp in enumerate(self._pending, first):
+            n = len(gdp.data)
+            for c in self.columns:
+                if c in gdp.data.columns:
+                    stacked[c].append(gdp.data[c].to_numpy(dtype=float))
+                elif c.endswith(('_uc_scor', '_uc_tcor')):  # missing correlated components count as 0
+                    stacked[c].append(np.zeros(n))
+                else:
+                    raise KeyError(f"Column {c} missing from GDP {gdp.product_id}")
+            stacked['profile'].append(np.full(n, i))
+        self._pending = []
+        data = pd.DataFrame({c: np.concatenate(arrays) for c, arrays in stacked.items()})
+        stats = sufficient_statistics(data, {'profile': data['profile'], 'cell': self.cells(data[self.bin_column])}, self.columns, self.backend)
+        self.stats = merge_statistics(self.stats, stats)
+
+    def regrid(self, bin_size=None, target_columns=None, mandatory_levels_flag=False, levels=None, as_table=False):
+        """
+        Grid the profiles from the cell statistics, like spatial_gridding_many.
+        bin_size (float): size of the regular bins, a multiple of cell_size in the same units (ln(hPa)
+            if log). Bins are keyed by their centre in bin_column units ('<bin_column>_bin').
+        target_columns (list): subset of the target columns of the pyramid, defaults to all of them.
+        mandatory_levels_flag (bool), levels (list): nearest-level bins keyed by 'mand_lvl' (the levels of
+            the pyramid) or 'lvl' (the given levels), for press pyramids only.
+        as_table (bool): return one tidy DataFrame instead of a list of GDs, one per GDP in push order.
+        """
+        self._flush()
+        target_columns = self.target_columns if target_columns is None else list(target_columns)
+        assert set(target_columns) <= set(self.target_columns), f"target columns must be among {self.target_columns}"
+        stats = self.stats if self.stats is not None else sufficient_statistics(
+            pd.DataFrame({c: np.empty(0) for c in self.columns}), {'profile': np.empty(0), 'cell': np.empty(0)}, self.columns)
+        profile = stats.index.get_level_values('profile').to_numpy()
+        cell = stats.index.get_level_values('cell').to_numpy(dtype=float)
+        if levels is not None or mandatory_levels_flag:
+            assert self.bin_column == 'press', "level bins need a press pyramid"
+            key = 'lvl' if levels is not None else 'mand_lvl'
+            levels = levels if levels is not None else self.levels
+            assert levels is not None, "no levels given"
+            keys = nearest_levels(self._coordinates((cell + 0.5) * self.cell_size), levels)
+            size = None
+        else:
+            assert bin_size is not None, "bin_size is required for regular bins"
+            cells_per_bin = int(round(bin_size / self.cell_size))
+            assert cells_per_bin >= 1 and np.isclose(cells_per_bin * self.cell_size, bin_size), \
+                f"bin_size must be a multiple of the cell size {self.cell_size}"
+            key = self.bin_column + '_bin'
+            keys = self._coordinates((cell // cells_per_bin) * bin_size + bin_size / 2)
+            size = bin_size
+        stats = combine_statistics(stats, [profile, keys])
+        stats.index.names = ['profile', key]
+        binned_data = spatial_equations(stats, self.bin_column, target_columns)
+
+        if as_table:
+            binned_data.insert(1, 'product_id', np.array(self.product_ids, dtype=object)[binned_data['profile'].to_numpy(dtype=int)])
+            return binned_data
+        settings = gridding_settings([
+            ('Type', 'Spatial Gridding'), ('BinColumn', self.bin_column), ('BinSize', str(size)),
+            ('BinScale', 'log' if self.log else 'linear'), ('TargetColumns', ', '.join(target_columns))
+        ])
+        return profile_gds(binned_data, self.global_attrs, settings)
+
+    def save(self, path):
+        self._flush()
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            pyramid = pickle.load(f)
+        assert isinstance(pyramid, cls), f"{path} does not contain a {cls.__name__}"
+        return pyramid
@@ -0,0 +1,203 @@
+"""
+Vectorized engine of the GRUAN gridding (GRUAN-TN-13, spatial equations 3.5-3.11 and temporal 3.12-3.18).
+
+Every gridding equation is a function of a few per-bin sums, so the data is grouped once and, for
+each column x, the number of valid values (x_n), their sum (x_sum), their sum of squares (x_sumsq)
+and their sum of squared deviations from the bin mean (x_m2) are accumulated together with the
+number of rows of the bin (n). The equations are then evaluated on these sufficient statistics.
+Sufficient statistics are mergeable: the statistics of two sets of rows falling in the same bin are
+the sum of their statistics, plus the spread of their means for x_m2 (Chan et al. parallel variance),
+so variances never come from the cancellation-prone sumsq - sum**2/n.
+
+As in the original per-bin formulas, means skip missing values while the 1/n factors of the
+uncertainty equations count every row of the bin, and 3.7 is undefined (NaN) for single-row bins.
+"""
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+# calendar time bins, each bin starts at the beginning of the period (seasons: DJF, MAM, JJA, SON)
+TIME_BINS = {'day': 'D', 'week': 'W-MON', 'month': 'MS', 'season': 'QS-DEC', 'year': 'YS'}
+
+def nearest_levels(values, levels):
+    """
+    Return the level nearest to each value, ties going to the larger level.
+    Missing values are assigned to the largest level.
+    """
+    levels = np.sort(np.asarray(levels, dtype=float))
+    midpoints = (levels[1:] + levels[:-1]) / 2
+    return levels[np.searchsorted(midpoints, np.asarray(values, dtype=float), side='right')]
+
+def regular_bins(values, bin_size):
+    """
+    Return the center of the regular bin of size bin_size containing each value.
+    """
+    return (np.asarray(values, dtype=float) // bin_size) * bin_size + bin_size / 2
+
+def time_bins(times, freq, origin='epoch'):
+    """
+    Return the start and the end of the time bin containing each time.
+    freq: number of days (int), calendar bin ('day', 'week', 'month', 'season', 'year') or any pandas
+        offset alias or object (e.g. '12h', '10D', 'MS').
+    origin: start of the first bin of fixed-length frequencies, 'epoch' (1970-01-01), 'start' (midnight
+        of the earliest time) or a timestamp. Calendar frequencies are aligned on the calendar.
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(np.asarray(times))).as_unit('ns')
+    offset = to_offset(f'{freq}D' if isinstance(freq, (int, np.integer)) else TIME_BINS.get(freq, freq))
+    valid = ~times.isna()
+    starts = np.full(len(times), np.datetime64('NaT'), dtype='datetime64[ns]')
+    ends = starts.copy()
+    if not valid.any():
+        return starts, ends
+    if isinstance(offset, pd.offsets.Tick):  # fixed length bins
+        origin = {'epoch': pd.Timestamp(0), 'start': times[valid].min().normalize()}.get(origin, origin)
+        step = pd.Timedelta(offset).value
+        ns = times.asi8[valid] - pd.Timestamp(origin).value
+        starts[valid] = (pd.Timestamp(origin).value + (ns // step) * step).astype('datetime64[ns]')
+        ends[valid] = starts[valid] + np.timedelta64(step, 'ns')
+    else:  # calendar bins, edges anchored on the calendar
+        first, last = times[valid].min(), times[valid].max()
+        edges = pd.date_range(offset.rollback(first.normalize()), last + offset, freq=offset).as_unit('ns').values
+        position = np.searchsorted(edges, times[valid].values, side='right') - 1
+        starts[valid] = edges[position]
+        ends[valid] = edges[position + 1]
+    return starts, ends
+
+# engines of the grouped aggregations, arrow and polars group on all the cores
+BACKENDS = ['pandas', 'arrow', 'polars']
+
+def sufficient_statistics(data, keys, columns, backend='pandas'):
+    """
+    Group the rows of data by keys in one pass and return, per group, the number of rows n and
+    the <column>_n, <column>_sum, <column>_sumsq and <column>_m2 statistics of each column.
+    data (DataFrame): input rows, not modified.
+    keys (dict): group key name -> array of one key per row, rows with a missing key are dropped.
+    columns (list): columns of data to accumulate.
+    backend (str): 'pandas', 'arrow' (pyarrow) or 'polars', all giving the same statistics.
+    """
+    assert backend in BACKENDS, f"backend must be one of {BACKENDS}"
+    columns = list(dict.fromkeys(columns))
+    frame = {'n': np.ones(len(data), dtype=np.int64)}
+    for column in columns:
+        values = data[column].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        frame[column + '_m2'] = values  # missing values skipped by the variance
+        values = np.where(valid, values, 0.0)
+        frame[column + '_n'] = valid.astype(np.int64)
+        frame[column + '_sum'] = values
+        frame[column + '_sumsq'] = values * values
+    frame.update({name: np.asarray(key) for name, key in keys.items()})
+    sums = ['n'] + [column + suffix for column in columns for suffix in ['_n', '_sum', '_sumsq']]
+    spreads = [column + '_m2' for column in columns]
+    if backend == 'pandas':
+        grouped = pd.DataFrame(frame).groupby(list(keys), sort=True)
+        stats = pd.concat([grouped[sums].sum(), grouped[spreads].var(ddof=0)], axis=1)
+    else:
+        valid = ~np.any([pd.isna(frame[name]) for name in keys], axis=0) if len(data) else np.ones(0, dtype=bool)
+        frame = {name: values[valid] for name, values in frame.items()}
+        if backend == 'arrow':
+            try:
+                import pyarrow as pa
+                import pyarrow.compute as pc
+            except ImportError:
+                raise ImportError("pyarrow is required by the arrow backend (pip install pyarrow)")
+            table = pa.table({name: pa.array(values, from_pandas=name in spreads) for name, values in frame.items()})
+            table = table.group_by(list(keys), use_threads=True).aggregate(
+                [(name, 'sum') for name in sums] + [(name, 'variance', pc.VarianceOptions(ddof=0)) for name in spreads])
+            names = {f'{name}_sum': name for name in sums} | {f'{name}_variance': name for name in spreads}
+            stats = table.rename_columns([names.get(name, name) for name in table.column_names]).to_pandas()
+        else:
+            try:
+                import polars as pl
+            except ImportError:
+                raise ImportError("polars is required by the polars backend (pip install polars)")
+            stats = pl.DataFrame(frame).group_by(list(keys)).agg(
+                [pl.col(sums).sum()] + [pl.col(name).fill_nan(None).var(ddof=0) for name in spreads]).to_pandas()
+        stats = stats.sort_values(list(keys)).set_index(list(keys))
+        stats = stats.astype({name: frame[name].dtype for name in sums})
+    for column in columns:  # variance -> sum of squared deviations
+        stats[column + '_m2'] = stats[column + '_m2'].fillna(0) * stats[column + '_n']
+    return stats[['n'] + [column + suffix for column in columns for suffix in ['_n', '_sum', '_sumsq', '_m2']]]
+
+def combine_statistics(stats, by):
+    """
+    Merge the rows of sufficient statistics grouped by by (index level names or arrays of one key
+    per row), e.g. fine bins into coarser ones.
+    """
+    grouped = stats.groupby(by, sort=True)
+    combined = grouped.sum()
+    codes = grouped.ngroup().to_numpy()
+    for name in [name for name in stats.columns if name.endswith('_m2')]:
+        column = name[:-3]
+        count = stats[column + '_n'].to_numpy()
+        with np.errstate(invalid='ignore'):
+            spread = count * (_mean(stats, column) - _mean(combined, column)[codes])**2  # spread of the merged means
+        combined[name] += np.bincount(codes, np.where(count > 0, spread, 0.0), minlength=len(combined))
+    return combined
+
+def merge_statistics(*stats):
+    """
+    Merge sufficient statistics computed on different rows (e.g. different profiles or chunks).
+    """
+    stats = [s for s in stats if s is not None and len(s)]
+    if not stats:
+        return None
+    return combine_statistics(pd.concat(stats), list(stats[0].index.names))
+
+def _mean(stats, column):
+    count = stats[column + '_n'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, stats[column + '_sum'].to_numpy() / count, np.nan)
+
+def _sum_squared_deviations(stats, column):
+    return stats[column + '_m2'].to_numpy()
+
+def spatial_equations(stats, bin_column, target_columns):
+    """
+    Evaluate the spatial gridding equations 3.5-3.11 on sufficient statistics.
+    Returns a DataFrame with the group keys, the mean of the target columns and of bin_column, and
+    for each target column the _uc_ucor_avg, _var, _uc_ucor, _uc_scor, _uc_tcor and _uc uncertainties.
+    Components missing from the statistics are taken as 0.
+    """
+    n = stats['n'].to_numpy(dtype=float)
+    columns = {}
+    for col in target_columns:
+        columns[col] = _mean(stats, col) # 3.5
+    columns[bin_column] = _mean(stats, bin_column)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for col in target_columns:
+            ucor_avg = np.sqrt(stats[col + '_uc_ucor_sumsq'].to_numpy()) / n #3.6
+            var = np.sqrt(_sum_squared_deviations(stats, col) / (n * (n - 1))) #3.7
+            columns[col + '_uc_ucor_avg'] = ucor_avg
+            columns[col + '_var'] = var
+            columns[col + '_uc_ucor'] = np.sqrt(ucor_avg**2 + var**2) #3.8
+            for component in ['_uc_scor', '_uc_tcor']: # 3.9, 3.10
+                columns[col + component] = _mean(stats, col + component) if col + component + '_n' in stats else np.zeros(len(n))
+            columns[col + '_uc'] = np.sqrt(
+                columns[col + '_uc_ucor']**2 + columns[col + '_uc_scor']**2 + columns[col + '_uc_tcor']**2) #3.11
+    keys = stats.index.to_frame(index=False)
+    return pd.concat([keys, pd.DataFrame(columns, index=keys.index)], axis=1)
+
+def temporal_equations(stats, target_columns):
+    """
+    Evaluate the temporal gridding equations 3.12-3.18 on sufficient statistics of spatially gridded data.
+    Returns a DataFrame with the group keys, the mean of the target columns and for each of them the
+    _uc_ucor_avg, _var, _uc_sc, _uc_ucor, _cor and _uc uncertainties.
+    """
+    n = stats['n'].to_numpy(dtype=float)
+    columns = {}
+    for col in target_columns:
+        columns[col] = _mean(stats, col) # 3.12
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for col in target_columns:
+            ucor_avg = np.sqrt(stats[col + '_uc_ucor_sumsq'].to_numpy()) / n #3.13
+            var = np.sqrt(_sum_squared_deviations(stats, col) / (n * np.maximum(n - 1, 1))) #3.14
+            scor = np.sqrt(stats[col + '_uc_scor_sumsq'].to_numpy()) / n #3.15
+            columns[col + '_uc_ucor_avg'] = ucor_avg
+            columns[col + '_var'] = var
+            columns[col + '_uc_sc'] = scor
+            columns[col + '_uc_ucor'] = np.sqrt(ucor_avg**2 + var**2 + scor**2) #3.16
+            columns[col + '_cor'] = _mean(stats, col + '_uc_tcor') #3.17
+            columns[col + '_uc'] = np.sqrt(columns[col + '_uc_ucor']**2 + columns[col + '_cor']**2) #3.18
+    keys = stats.index.to_frame(index=False)
+    return pd.concat([keys, pd.DataFrame(columns, index=keys.index)], axis=1)
@@ -0,0 +1,45 @@
+"""
+Small helpers to run GRUANpy tasks on a pool of workers while keeping memory bounded.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+
+EXECUTORS = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+
+def bounded_map(fn, items, workers=None, executor='thread', ordered=True, prefetch=None):
+    """
+    Lazily apply fn to every item on a pool of workers and yield the results.
+    At most prefetch tasks (default 2*workers) are submitted ahead of the consumer,
+    so only a bounded number of results is held in memory at any time.
+    If ordered is False, results are yielded as soon as they are ready.
+    With process executor fn must be picklable (a module level function or a partial of it).
+    Threads suit I/O bound tasks (e.g. FTP transfers), netCDF decoding needs processes to run in parallel.
+    """
+    assert executor in EXECUTORS, f"executor must be one of {list(EXECUTORS)}"
+    workers = workers or os.cpu_count() or 1
+    prefetch = max(prefetch or 2 * workers, 1)
+    items = iter(items)
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        pending = deque()
+        def submit(n):
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= n:
+                    break
+        submit(prefetch)
+        try:
+            while pending:
+                if ordered:
+                    future = pending.popleft()
+                    result = future.result()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = done.pop()
+                    pending.remove(future)
+                    result = future.result()
+                yield result
+                submit(len(pending) + 1)
+        finally:
+            for future in pending:
+                future.cancel()
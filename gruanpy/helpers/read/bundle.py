@@ -0,0 +1,49 @@
+"""
+Access to the GDP files packed in zip or tar bundles (e.g. the annual products_RS41-GDP-1_LIN_2017
+archives of the GRUAN portal), without unpacking them.
+
+Members are read sequentially from the bundle, in archive order, and handed over as bytes, so that
+compressed tar files are streamed once and no file is written to disk. The format is detected from
+the content, the bundle name does not need an extension.
+"""
+import fnmatch
+import posixpath
+import tarfile
+import zipfile
+
+def _matches(name, pattern):
+    return fnmatch.fnmatch(posixpath.basename(name), pattern)
+
+def list_members(bundle_path, pattern='*.nc'):
+    """
+    Return the names of the bundle members whose file name matches pattern.
+    """
+    if zipfile.is_zipfile(bundle_path):
+        with zipfile.ZipFile(bundle_path) as bundle:
+            return [info.filename for info in bundle.infolist() if not info.is_dir() and _matches(info.filename, pattern)]
+    if tarfile.is_tarfile(bundle_path):
+        with tarfile.open(bundle_path, 'r:*') as bundle:
+            return [member.name for member in bundle if member.isfile() and _matches(member.name, pattern)]
+    raise ValueError(f"Unsupported bundle format (zip or tar expected): {bundle_path}")
+
+def iter_members(bundle_path, members=None, pattern='*.nc'):
+    """
+    Yield (name, bytes) for the selected members of a bundle, in archive order.
+    members (list): names of the members to read, defaults to all the members matching pattern.
+    """
+    selected = None if members is None else set(members)
+    def wanted(name):
+        return name in selected if selected is not None else _matches(name, pattern)
+    if zipfile.is_zipfile(bundle_path):
+        with zipfile.ZipFile(bundle_path) as bundle:
+            for info in bundle.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    yield info.filename, bundle.read(info)
+        return
+    if tarfile.is_tarfile(bundle_path):
+        with tarfile.open(bundle_path, 'r|*') as bundle:  # stream mode, compressed tars are read once
+            for member in bundle:
+                if member.isfile() and wanted(member.name):
+                    yield member.name, bundle.extractfile(member).read()
+        return
+    raise ValueError(f"Unsupported bundle format (zip or tar expected): {bundle_path}")
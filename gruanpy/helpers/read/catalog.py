@@ -0,0 +1,177 @@
+"""
+SQLite index of GDP archives.
+
+Each GDP file is indexed once, either from its file name only (fast, no file is opened) or from its
+global attributes, and the index is updated incrementally: files whose size and mtime did not change
+are not parsed again. Queries by site, time range, launch hour, time of day, product version and
+instrument then run on the index instead of scanning the archive.
+
+The product id and the time of day are global attributes that file names do not carry: filtering by
+time of day and keeping one file per product id need the files to be indexed with from_attrs=True.
+
+GDP file names follow the GRUAN convention, e.g. LIN-RS-01_2_RS41-GDP_001_20170101T000000_1-000-001.nc
+(station, processing level, product, product version, launch time, ascent id).
+"""
+import os
+import re
+import sqlite3
+import pandas as pd
+
+GDP_FILENAME = re.compile(
+    r'^(?P<station>[A-Z]{3}-[A-Z]{2}-\d{2})_(?P<level>\d+)_(?P<product>.+?)_(?P<version>\d{3})'
+    r'_(?P<start_time>\d{8}T\d{6})_(?P<ascent>[\w-]+)\.nc$'
+)
+
+COLUMNS = {
+    'path': 'TEXT PRIMARY KEY', 'size': 'INTEGER', 'mtime': 'INTEGER',
+    'station': 'TEXT', 'site': 'TEXT', 'site_name': 'TEXT', 'product': 'TEXT', 'instrument': 'TEXT',
+    'version': 'INTEGER', 'level': 'INTEGER', 'ascent': 'TEXT', 'start_time': 'TEXT',
+    'standard_time': 'TEXT', 'time_of_day': 'TEXT', 'product_id': 'TEXT',
+}
+
+# global attributes used to complete the filename fields
+ATTRIBUTES = {
+    'g.Product.Id': 'product_id',
+    'g.Site.Name': 'site_name',
+    'g.Measurement.StartTime': 'start_time',
+    'g.Measurement.StandardTime': 'standard_time',
+    'g.Measurement.TimeOfDay': 'time_of_day',
+}
+
+def _timestamp(value):
+    # normalize GDP timestamps (20170101T000000 or 2017-01-01T00:00:00.000Z) to sortable text
+    return pd.Timestamp(value).tz_localize(None).strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+def parse_gdp_filename(file_name):
+    """
+    Parse the fields of a GDP file name, return None if the name does not follow the GRUAN convention.
+    """
+    match = GDP_FILENAME.match(os.path.basename(file_name))
+    if match is None:
+        return None
+    fields = match.groupdict()
+    fields['site'] = fields['station'][:3]
+    fields['instrument'] = fields['product'].removesuffix('-GDP')
+    fields['version'] = int(fields['version'])
+    fields['level'] = int(fields['level'])
+    fields['start_time'] = _timestamp(fields['start_time'])
+    return fields
+
+class Catalog:
+    """
+    SQLite index of GDP files.
+    db_path (str): path of the SQLite database, created if missing.
+    reader: object with a read_many method, used when indexing from global attributes.
+    """
+    def __init__(self, db_path, reader=None):
+        self.db_path = db_path
+        self.reader = reader
+        self.connection = sqlite3.connect(db_path)
+        columns = ', '.join(f'{name} {kind}' for name, kind in COLUMNS.items())
+        with self.connection:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS gdp ({columns})')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS gdp_site_time ON gdp (site, start_time)')
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM gdp').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, paths_or_folder, from_attrs=False, prune=False, workers=None):
+        """
+        Index new or modified GDP files and return the number of files (re)indexed.
+        paths_or_folder (str or list): a folder of .nc files or a list of file paths.
+        from_attrs (bool): also read the global attributes (product id, time of day, ...) of new files
+            and of files indexed so far from their name only.
+        prune (bool): drop from the index the files that are no longer on disk.
+        """
+        if isinstance(paths_or_folder, (str, os.PathLike)) and os.path.isdir(paths_or_folder):
+            paths = [os.path.join(paths_or_folder, f) for f in sorted(os.listdir(paths_or_folder)) if f.endswith('.nc')]
+        else:
+            paths = [paths_or_folder] if isinstance(paths_or_folder, (str, os.PathLike)) else list(paths_or_folder)
+        paths = [os.path.abspath(p) for p in paths]
+        known = {path: (size, mtime, product_id) for path, size, mtime, product_id in
+                 self.connection.execute('SELECT path, size, mtime, product_id FROM gdp')}
+
+        rows = []
+        for path in paths:
+            stat = os.stat(path)
+            size, mtime, product_id = known.get(path, (None, None, None))
+            if (size, mtime) == (stat.st_size, stat.st_mtime_ns) and (product_id is not None or not from_attrs):
+                continue
+            row = dict.fromkeys(COLUMNS)
+            row.update(parse_gdp_filename(path) or {})
+            row.update(path=path, size=stat.st_size, mtime=stat.st_mtime_ns)
+            rows.append(row)
+
+        if from_attrs and rows:
+            assert self.reader is not None, "a reader is needed to index global attributes"
+            gdps = self.reader.read_many([row['path'] for row in rows], workers=workers, only_global_attrs=True)
+            for row, gdp in zip(rows, gdps):
+                for attribute, column in ATTRIBUTES.items():
+                    if attribute in gdp.attrs:
+                        row[column] = gdp.attr(attribute)
+                row['start_time'] = _timestamp(row['start_time'])
+                row['standard_time'] = _timestamp(row['standard_time'])
+
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO gdp ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(row[c] for c in COLUMNS) for row in rows]
+            )
+            if prune:
+                missing = set(known) - set(paths)
+                self.connection.executemany('DELETE FROM gdp WHERE path = ?', [(p,) for p in missing if not os.path.exists(p)])
+        return len(rows)
+
+    def query(self, site=None, start=None, end=None, hours=None, time_of_day=None,
+              product=None, version=None, instrument=None, unique=None):
+        """
+        Return the indexed GDPs matching all the given filters as a DataFrame sorted by start time.
+        site, time_of_day, product, instrument (str or list): exact matches.
+        start, end (str or datetime): launch time range, end excluded.
+        hours (list): launch hours, e.g. [0, 12] for the synoptic launches.
+        version (int or list): product version.
+        unique (bool): keep only one file per product id, defaults to True when all the matching files
+            have a product id.
+        time_of_day and unique=True raise a ValueError if some matching files were indexed from their name only.
+        """
+        clauses, params = [], []
+        for column, value in [('site', site), ('product', product), ('version', version), ('instrument', instrument)]:
+            if value is None:
+                continue
+            values = [value] if isinstance(value, (str, int)) else list(value)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += values
+        if start is not None:
+            clauses.append('start_time >= ?')
+            params.append(_timestamp(start))
+        if end is not None:
+            clauses.append('start_time < ?')
+            params.append(_timestamp(end))
+        if hours is not None:
+            clauses.append(f"CAST(strftime('%H', start_time) AS INTEGER) IN ({', '.join('?' * len(hours))})")
+            params += [int(h) for h in hours]
+        if time_of_day is not None:
+            # files indexed from their name only have no time of day and would be silently left out
+            missing = self.connection.execute(' AND '.join(['SELECT COUNT(*) FROM gdp WHERE time_of_day IS NULL', *clauses]), params).fetchone()[0]
+            if missing:
+                raise ValueError(f"{missing} matching files have no time of day, index them with from_attrs=True")
+            values = [time_of_day] if isinstance(time_of_day, str) else list(time_of_day)
+            clauses.append(f"time_of_day IN ({', '.join('?' * len(values))})")
+            params += values
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        result = pd.read_sql_query(f'SELECT * FROM gdp{where} ORDER BY start_time, path', self.connection, params=params)
+        missing = result['product_id'].isna().sum()
+        if unique and missing:
+            raise ValueError(f"{missing} matching files have no product id, index them with from_attrs=True")
+        if unique or (unique is None and not missing):
+            result = result[~result['product_id'].duplicated()].reset_index(drop=True)
+        return result
+
+    def paths(self, **filters):
+        """
+        Return the paths of the indexed GDPs matching the query filters.
+        """
+        return self.query(**filters)['path'].tolist()
@@ -0,0 +1,147 @@
+"""
+Streaming reader of the CSV files delivered by the Copernicus Climate Data Store (CDS) for the
+GRUAN dataset (insitu-observations-gruan-reference-network).
+
+CDS files use the Common Data Model (CDM) long layout, one row per observed value:
+    station_name, report_timestamp, report_id, actual_time, air_pressure, observed_variable, observation_value, ...
+The reader streams the file in blocks, groups the rows of each report (one ascent), pivots the
+observed variables into the GDP column layout (temp, rh, press, ...) and yields one GDP per report,
+so that only one report and one block are in memory at a time. Files in the wide layout (one column
+per variable) are renamed instead of pivoted. Rows of a report are expected to be contiguous, as
+in the CDS exports.
+"""
+import itertools
+import numpy as np
+import pandas as pd
+from gruanpy.data_models.gdp import GDP
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # optional dependency, pandas is used instead
+    pacsv = None
+
+# CDM observed variable -> GDP column
+CDM_VARIABLES = {
+    'air_temperature': 'temp',
+    'relative_humidity': 'rh',
+    'air_pressure': 'press',
+    'altitude': 'alt',
+    'geopotential_height': 'geopot',
+    'wind_speed': 'wspeed',
+    'wind_from_direction': 'wdir',
+    'eastward_wind_speed': 'wzon',
+    'northward_wind_speed': 'wmeri',
+    'water_vapour_mixing_ratio': 'wvmr_mass',
+    'dew_point_temperature': 'dewpoint',
+}
+
+# per level CDM columns -> GDP column
+CDM_LEVEL_COLUMNS = {
+    'actual_time': 'time',
+    'air_pressure': 'press',
+    'latitude': 'lat',
+    'longitude': 'lon',
+}
+
+# per report CDM columns -> GDP global attribute
+CDM_ATTRIBUTES = {
+    'report_id': 'g.Product.Id',
+    'station_name': 'g.Site.Name',
+    'report_timestamp': 'g.Measurement.StartTime',
+    'radiosonde_type': 'g.Instrument.Type',
+    'height_of_station_above_sea_level': 'g.Site.Altitude',
+}
+
+UNCERTAINTY_COLUMNS = ['total_uncertainty', 'uncertainty_value', 'uncertainty_value1']
+
+# identifier and text columns, read as strings whatever the first rows look like
+TEXT_COLUMNS = ['report_id', 'station_name', 'primary_station_id', 'radiosonde_type', 'observed_variable', 'units']
+
+def _count_comment_lines(file_path, comment='#'):
+    with open(file_path, 'r') as f:
+        return sum(1 for _ in itertools.takewhile(lambda line: line.startswith(comment), f))
+
+def _blocks(file_path, block_size):
+    # stream DataFrames of about block_size bytes, with pyarrow when available
+    skip_rows = _count_comment_lines(file_path)
+    if pacsv is not None:
+        read_options = pacsv.ReadOptions(skip_rows=skip_rows, block_size=block_size)
+        column_types = {c: pa.string() for c in TEXT_COLUMNS}
+        reader = pacsv.open_csv(file_path, read_options=read_options, convert_options=pacsv.ConvertOptions(
+            column_types=column_types, strings_can_be_null=True))
+        # types are inferred on the first block only: a column empty there would reject later values
+        nulls = {field.name: pa.float64() for field in reader.schema if pa.types.is_null(field.type)}
+        if nulls:
+            reader.close()
+            reader = pacsv.open_csv(file_path, read_options=read_options, convert_options=pacsv.ConvertOptions(
+                column_types={**column_types, **nulls}, strings_can_be_null=True))
+        for batch in reader:
+            yield batch.to_pandas()
+    else:
+        rows = max(block_size // 200, 1)  # ~200 bytes per CDS row
+        yield from pd.read_csv(file_path, skiprows=skip_rows, chunksize=rows, dtype={c: str for c in TEXT_COLUMNS})
+
+def _format_time(value):
+    return pd.Timestamp(value).tz_localize(None).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def cdm_report_to_gdp(report):
+    """
+    Convert the rows of one CDS report into a GDP.
+    """
+    first = report.iloc[0]
+    global_attrs = pd.DataFrame([
+        (attribute, _format_time(first[column]) if column == 'report_timestamp' else
+         str(first[column]) if column in TEXT_COLUMNS and pd.notna(first[column]) else first[column])
+        for column, attribute in CDM_ATTRIBUTES.items() if column in report
+    ], columns=['Attribute', 'Value'])
+
+    if 'observed_variable' in report:  # long layout, a level is identified by its time and pressure
+        keys = [c for c in ['actual_time', 'air_pressure'] if c in report]
+        unc = next((c for c in UNCERTAINTY_COLUMNS if c in report), None)
+        values = ['observation_value'] + ([unc] if unc else [])
+        wide = report.pivot_table(index=keys, columns='observed_variable', aggfunc='first', values=values)
+        # pivot_table drops the all-missing columns, e.g. a variable reported without uncertainty
+        wide = wide.reindex(columns=pd.MultiIndex.from_product([values, report['observed_variable'].dropna().unique()]))
+        data = {}
+        for variable in wide['observation_value'].columns:
+            name = CDM_VARIABLES.get(variable, variable)
+            data[name] = wide[('observation_value', variable)]
+            if unc:
+                data[name + '_uc'] = wide[(unc, variable)]
+        others = [c for c in CDM_LEVEL_COLUMNS if c in report and c not in keys]
+        if others:
+            firsts = report.groupby(keys)[others].first()
+            data.update({c: firsts[c] for c in others})
+        data = pd.DataFrame(data).reset_index().rename(columns=CDM_LEVEL_COLUMNS)
+    else:  # wide layout
+        data = report.drop(columns=[c for c in CDM_ATTRIBUTES if c in report])
+        data = data.rename(columns={**CDM_LEVEL_COLUMNS, **CDM_VARIABLES})
+
+    if 'time' in data:
+        data['time'] = pd.to_datetime(data['time'], utc=True).dt.tz_localize(None).astype('datetime64[ns]')
+    if 'alt' in data:
+        data = data.sort_values('alt')
+    elif 'time' in data:
+        data = data.sort_values('time')
+    elif 'press' in data:
+        data = data.sort_values('press', ascending=False)
+    data = data.reset_index(drop=True)
+    return GDP(global_attrs, data, None)
+
+def stream_cdm_reports(file_path, report_column='report_id', block_size=1 << 24):
+    """
+    Yield the rows of each report of a CDS CSV file as a DataFrame, reading block_size bytes at a time.
+    """
+    pending = None
+    for block in _blocks(file_path, block_size):
+        if pending is not None:
+            block = pd.concat([pending, block], ignore_index=True)
+        ids = block[report_column].to_numpy()
+        # positions where a new report starts
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        # the last report may continue in the next block
+        for start, stop in zip(starts[:-1], starts[1:]):
+            yield block.iloc[start:stop]
+        pending = block.iloc[starts[-1]:] if len(block) else None
+    if pending is not None and len(pending):
+        yield pending
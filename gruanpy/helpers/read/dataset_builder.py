@@ -0,0 +1,106 @@
+"""
+Incremental builder of GDP stores.
+
+The builder appends to a GDPStore only the files it has not processed yet, keeping a manifest
+(manifest.jsonl in the store folder) with one line per processed file: its size and mtime and
+whether it was stored, skipped as a duplicate product id or failed (with the error). Profiles are
+cut at upper_bound meters above ground before being stored. The manifest line of a file is written
+after its profile is committed to the store, so an interrupted build resumes where it stopped.
+"""
+import json
+import os
+from functools import partial
+from gruanpy.helpers.parallel import bounded_map
+from gruanpy.helpers.read.gdp_store import GDPStore
+
+def _load_profile(file_path, read_file, upper_bound=None):
+    # worker: read and cut one profile, errors are returned to be recorded in the manifest
+    try:
+        gdp = read_file(file_path)
+        if upper_bound is not None:
+            gdp.data = gdp.data[gdp.data['alt'] <= gdp.data['alt'].min() + upper_bound].reset_index(drop=True)
+        return file_path, gdp, None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+class DatasetBuilder:
+    """
+    Build a GDPStore incrementally from GDP files.
+    store_path (str): store folder, created if missing.
+    read_file: picklable callable reading one file into a GDP.
+    upper_bound (float): keep only the levels up to upper_bound meters above the lowest altitude.
+    workers, executor: parallel reading, see ReadingManager.read_many.
+    """
+    def __init__(self, store_path, read_file, upper_bound=None, workers=None, executor='process'):
+        self.store = GDPStore(store_path, mode='a')
+        self.read_file = read_file
+        self.upper_bound = upper_bound
+        self.workers = workers
+        self.executor = executor
+        self.manifest_path = os.path.join(store_path, 'manifest.jsonl')
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # interrupted write
+                    manifest[entry['path']] = entry
+        return manifest
+
+    def _record(self, entry):
+        self.manifest[entry['path']] = entry
+        with open(self.manifest_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    @property
+    def failures(self):
+        return {path: entry['error'] for path, entry in self.manifest.items() if entry['status'] == 'failed'}
+
+    def pending(self, file_paths, retry_failed=False):
+        """
+        Return the files not processed yet (new or modified since they were processed).
+        """
+        pending = []
+        for path in file_paths:
+            path = os.path.abspath(path)
+            entry = self.manifest.get(path)
+            stat = os.stat(path)
+            if entry is not None and (entry['size'], entry['mtime']) == (stat.st_size, stat.st_mtime_ns):
+                if entry['status'] != 'failed' or not retry_failed:
+                    continue
+            pending.append(path)
+        return pending
+
+    def update(self, file_paths, retry_failed=False, progress=None):
+        """
+        Append the new files to the store and return the number of files per status
+        ('stored', 'duplicate', 'failed').
+        retry_failed (bool): read again the files that failed previously.
+        progress (callable): optional wrapper of the result iterator, e.g. tqdm.tqdm.
+        """
+        pending = self.pending(file_paths, retry_failed)
+        stored_ids = {entry['product_id'] for entry in self.manifest.values() if entry['status'] == 'stored'}
+        loader = partial(_load_profile, read_file=self.read_file, upper_bound=self.upper_bound)
+        results = bounded_map(loader, pending, self.workers, self.executor)
+        if progress is not None:
+            results = progress(results, total=len(pending))
+        counts = {'stored': 0, 'duplicate': 0, 'failed': 0}
+        for path, gdp, error in results:
+            stat = os.stat(path)
+            entry = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'product_id': None, 'error': error}
+            if gdp is None:
+                entry['status'] = 'failed'
+            else:
+                entry['product_id'] = gdp.product_id
+                # a product id already in the store but not in the manifest was stored by an interrupted run
+                appended = self.store.append(gdp)
+                entry['status'] = 'stored' if appended or gdp.product_id not in stored_ids else 'duplicate'
+                stored_ids.add(gdp.product_id)
+            self._record(entry)
+            counts[entry['status']] += 1
+        return counts
@@ -0,0 +1,118 @@
+"""
+On-disk cache of decoded GDPs.
+
+The data table of each GDP is stored as an Arrow IPC file, which is memory-mapped on read so that
+only the requested columns are touched. global_attrs and variables_attrs are stored in a small
+pickle sidecar. Entries are keyed on the absolute path, size and modification time of the source
+file, so a changed file is decoded again. Once the cache grows beyond max_bytes the least recently
+used entries are evicted.
+"""
+import hashlib
+import os
+import pickle
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # optional dependency
+    pa = None
+
+class GDPCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024**3):
+        if pa is None:
+            raise ImportError("pyarrow is required to use the GDP cache (pip install pyarrow)")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, file_path):
+        stat = os.stat(file_path)
+        ident = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(ident.encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.arrow', base + '.attrs.pkl'
+
+    def get_attrs(self, file_path):
+        """
+        Return (global_attrs, variables_attrs) of a cached GDP or None on a miss.
+        """
+        table_path, attrs_path = self._paths(self.key(file_path))
+        if not os.path.exists(table_path):
+            return None
+        with open(attrs_path, 'rb') as f:
+            return pickle.load(f)
+
+    def get(self, file_path, columns=None):
+        """
+        Return (global_attrs, data, variables_attrs) of a cached GDP or None on a miss.
+        columns (list): load only these columns of the data table.
+        """
+        table_path, attrs_path = self._paths(self.key(file_path))
+        if not os.path.exists(table_path):
+            return None
+        with open(attrs_path, 'rb') as f:
+            global_attrs, variables_attrs = pickle.load(f)
+        with pa.memory_map(table_path, 'r') as source:
+            table = ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select([c for c in table.column_names if c in columns])
+            data = table.to_pandas()
+        os.utime(table_path)  # mark as recently used
+        return global_attrs, data, variables_attrs
+
+    def put(self, file_path, gdp):
+        """
+        Store a fully decoded GDP and evict old entries if the cache is over budget.
+        """
+        table_path, attrs_path = self._paths(self.key(file_path))
+        with open(attrs_path + '.tmp', 'wb') as f:
+            pickle.dump((gdp.global_attrs, gdp.variables_attrs), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(attrs_path + '.tmp', attrs_path)
+        table = pa.Table.from_pandas(gdp.data, preserve_index=False)
+        with pa.OSFile(table_path + '.tmp', 'wb') as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(table_path + '.tmp', table_path)  # the table file marks the entry as complete
+        self.evict()
+
+    def size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if not f.endswith('.arrow'):
+                continue
+            table_path, attrs_path = self._paths(f[:-len('.arrow')])
+            try:
+                stat = os.stat(table_path)
+                size = stat.st_size + os.path.getsize(attrs_path)
+            except OSError:  # removed by a concurrent eviction
+                continue
+            entries.append((stat.st_mtime, f[:-len('.arrow')], size))
+        return entries
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def clear(self):
+        for _, key, _ in self._entries():
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
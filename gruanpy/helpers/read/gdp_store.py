@@ -0,0 +1,196 @@
+"""
+Consolidated on-disk store of many GDPs.
+
+Profiles are stored as ragged arrays: the data of all profiles is concatenated column by column in
+one raw binary file per column, and an index records for every profile its product id, its
+[start, stop) rows and its global attributes. Each column file is memory-mapped once per store, on first
+access, so a GDP taken from the store is a read-only view on the mapped files and only the pages of the
+profiles actually used are read from disk. Views share the mappings (one file descriptor per column,
+however many GDPs are taken): use store.get(product_id, copy=True) for a GDP whose data can be modified.
+
+Store layout:
+    schema.json            column names and dtypes
+    variables_attrs.pkl    variables attributes (taken from the first profile)
+    <column>.bin           concatenated values of each column
+    index.jsonl            one line per profile, written last so that a crash never leaves a
+                           partially written profile in the index
+"""
+import json
+import os
+import pickle
+import warnings
+import numpy as np
+import pandas as pd
+from gruanpy.data_models.gdp import GDP
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+class GDPStore:
+    """
+    Memory-mapped store of GDPs, addressable by product id, position or slice.
+    path (str): store folder.
+    mode (str): 'r' to read, 'a' to read and append (the store is created if missing).
+    columns (list): columns to store, only used when the store is created. Defaults to all the
+        numeric, boolean and datetime columns of the first appended GDP.
+    """
+    def __init__(self, path, mode='r', columns=None):
+        assert mode in ['r', 'a'], "mode must be 'r' or 'a'"
+        self.path = path
+        self.mode = mode
+        self._columns = columns
+        if mode == 'a':
+            os.makedirs(path, exist_ok=True)
+        elif not os.path.isdir(path):
+            raise FileNotFoundError(f"GDP store not found: {path}")
+        self.schema = None
+        if os.path.exists(self._file('schema.json')):
+            with open(self._file('schema.json')) as f:
+                self.schema = {name: np.dtype(dtype) for name, dtype in json.load(f).items()}
+        self._variables_attrs = None
+        self._maps = {}
+        self._load_index()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load_index(self):
+        self.index = []
+        valid_bytes = 0
+        if os.path.exists(self._file('index.jsonl')):
+            with open(self._file('index.jsonl'), 'rb') as f:
+                for line in f:
+                    try:
+                        assert line.endswith(b'\n')
+                        self.index.append(json.loads(line))
+                    except (AssertionError, ValueError):
+                        break  # interrupted write, ignore the tail
+                    valid_bytes += len(line)
+            if self.mode == 'a':
+                os.truncate(self._file('index.jsonl'), valid_bytes)
+        self.positions = {entry['product_id']: i for i, entry in enumerate(self.index)}
+        self.n_rows = self.index[-1]['stop'] if self.index else 0
+
+    def _map(self, name, start, stop):
+        # read-only view of the rows [start, stop) of a column, on the mapping shared by all the views
+        dtype = self.schema[name]
+        if stop == start:
+            return np.empty(0, dtype=dtype)
+        column = self._maps.get(name)
+        if column is None or len(column) < stop:  # first access, or rows appended since
+            column = self._maps[name] = np.memmap(self._file(name + '.bin'), dtype=dtype, mode='r', shape=(self.n_rows,))
+        return np.asarray(column[start:stop])
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, product_id):
+        return product_id in self.positions
+
+    @property
+    def product_ids(self):
+        return [entry['product_id'] for entry in self.index]
+
+    def keys(self):
+        return self.product_ids
+
+    @property
+    def variables_attrs(self):
+        if self._variables_attrs is None and os.path.exists(self._file('variables_attrs.pkl')):
+            with open(self._file('variables_attrs.pkl'), 'rb') as f:
+                self._variables_attrs = pickle.load(f)
+        return self._variables_attrs
+
+    def _view(self, position, copy=False):
+        entry = self.index[position]
+        data = pd.DataFrame({name: self._map(name, entry['start'], entry['stop']) for name in self.schema}, copy=copy)
+        global_attrs = pd.DataFrame(entry['global_attrs'].items(), columns=['Attribute', 'Value'])
+        return GDP(global_attrs, data, self.variables_attrs)
+
+    def __getitem__(self, key):
+        """
+        store[product_id] or store[position] return a GDP, store[start:stop] a list of GDPs.
+        """
+        if isinstance(key, slice):
+            return [self._view(i) for i in range(*key.indices(len(self)))]
+        if isinstance(key, (int, np.integer)):
+            return self._view(key)
+        return self._view(self.positions[key])
+
+    def get(self, product_id, default=None, copy=False):
+        """
+        Return the GDP of a product id, or default if it is not stored.
+        copy (bool): copy the data into memory, so that it can be modified in place.
+        """
+        return self._view(self.positions[product_id], copy) if product_id in self else default
+
+    def items(self, copy=False):
+        """
+        Lazily iterate over (product_id, GDP) pairs, like the former pickled dictionaries.
+        """
+        for i, entry in enumerate(self.index):
+            yield entry['product_id'], self._view(i, copy)
+
+    def __iter__(self):
+        return iter(self.product_ids)
+
+    def _create_schema(self, gdp):
+        columns = self._columns or [
+            c for c in gdp.data.columns
+            if gdp.data[c].dtype.kind in 'biufM'
+        ]
+        skipped = [c for c in gdp.data.columns if c not in columns and self._columns is None]
+        if skipped:
+            warnings.warn(f"Columns not stored (unsupported dtype): {skipped}")
+        self.schema = {c: gdp.data[c].dtype for c in columns}
+        with open(self._file('schema.json'), 'w') as f:
+            json.dump({name: dtype.str for name, dtype in self.schema.items()}, f)
+        with open(self._file('variables_attrs.pkl'), 'wb') as f:
+            pickle.dump(gdp.variables_attrs, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def append(self, gdp, product_id=None):
+        """
+        Append a GDP to the store, return False if its product id is already stored.
+        product_id defaults to the g.Product.Id global attribute.
+        """
+        assert self.mode == 'a', "store opened in read-only mode"
+        global_attrs = gdp.attrs
+        product_id = product_id if product_id is not None else gdp.product_id
+        if product_id in self.positions:
+            return False
+        if self.schema is None:
+            self._create_schema(gdp)
+        n = len(gdp.data)
+        for name, dtype in self.schema.items():
+            if name in gdp.data:
+                values = gdp.data[name].to_numpy(dtype=dtype)
+            elif dtype.kind == 'f':
+                values = np.full(n, np.nan, dtype=dtype)
+            else:
+                raise KeyError(f"Column {name} missing from GDP {product_id}")
+            with open(self._file(name + '.bin'), 'ab') as f:
+                f.truncate(self.n_rows * dtype.itemsize)  # drop rows of an interrupted append
+                f.write(np.ascontiguousarray(values).tobytes())
+        entry = {'product_id': product_id, 'start': self.n_rows, 'stop': self.n_rows + n, 'global_attrs': global_attrs}
+        line = json.dumps(entry, default=_json_default)
+        with open(self._file('index.jsonl'), 'a') as f:
+            f.write(line + '\n')
+        self.index.append(json.loads(line))
+        self.positions[product_id] = len(self.index) - 1
+        self.n_rows += n
+        return True
+
+    @classmethod
+    def write(cls, path, gdps, columns=None):
+        """
+        Create a store from an iterable of GDPs (or a {product_id: GDP} dictionary) and return it.
+        """
+        store = cls(path, mode='a', columns=columns)
+        items = gdps.items() if isinstance(gdps, dict) else ((None, gdp) for gdp in gdps)
+        for product_id, gdp in items:
+            store.append(gdp, product_id)
+        return store
@@ -1,27 +1,320 @@
+import numpy as np
 import pandas as pd
 import xarray as xr
 from gruanpy.data_models.gdp import GDP
+from gruanpy.data_models.gd import parse_gruan_time
+from gruanpy.helpers.read.gdp_cache import GDPCache
+from gruanpy.helpers.read.catalog import Catalog
+from gruanpy.helpers.read.gdp_store import GDPStore
+from gruanpy.helpers.read.dataset_builder import DatasetBuilder
+from gruanpy.helpers.read.cdm import stream_cdm_reports, cdm_report_to_gdp
+from gruanpy.helpers.read.bundle import list_members, iter_members
+from gruanpy.helpers.download.remote_cache import RemoteCache, is_remote, fetch_url
+from gruanpy.helpers.parallel import bounded_map
+from functools import partial
+import io
 import os
+import threading
+
+# netCDF4/HDF5 decoding is not thread-safe: the threads of a process decode one file at a time
+_netcdf_lock = threading.Lock()
+
+def _read_file(file_path, read_kwargs, settings=None):
+    # module level so that it can be shipped to worker processes
+    rm = ReadingManager()
+    rm.__dict__.update(settings or {})
+    return rm.read(file_path, **read_kwargs)
+
+def _read_member(member, read_kwargs, settings=None):
+    # member is a (name, bytes) pair taken from a bundle
+    return _read_file(member[1], read_kwargs, settings)
+
+def _archive_profile(content, variables=None):
+    # open_mfdataset preprocess: one GDP becomes one profile with an integer level dimension
+    if variables is not None:
+        content = ReadingManager()._select_variables(content, variables)
+    dim = content['alt'].dims[0]
+    times = content[dim].values
+    content = content.drop_vars(dim).rename_dims({dim: 'level'})
+    content = content.assign_coords(level=np.arange(content.sizes['level']), time=('level', times))
+    attrs = content.attrs
+    start_time = parse_gruan_time(attrs.get('g.Measurement.StartTime'))
+    return content.assign_coords(
+        product_id=attrs.get('g.Product.Id', ''),
+        site=attrs.get('g.Site.Name', ''),
+        time_of_day=attrs.get('g.Measurement.TimeOfDay', ''),
+        start_time=np.datetime64(start_time, 'ns') if start_time else np.datetime64('NaT', 'ns'),
+    )
+
+def _open_dataset(source):
+    # open a GDP from a path, from bytes or from a binary file object, without writing it to disk
+    if isinstance(source, (str, os.PathLike)):
+        return xr.open_dataset(source)
+    data = bytes(source) if isinstance(source, (bytes, bytearray, memoryview)) else source.read()
+    try:
+        import netCDF4
+    except ImportError:
+        return xr.open_dataset(io.BytesIO(data), engine='h5netcdf')
+    return xr.open_dataset(xr.backends.NetCDF4DataStore(netCDF4.Dataset('inmemory.nc', memory=data)))
 
 class ReadingManager:
     """
     A class to read data files and obtain python gdp data object.
     """
     def __init__(self):
-        pass
-
-    def read(self, file_path, only_global_attrs=False):
-        content=xr.open_dataset(file_path)
-        global_attrs=pd.DataFrame(content.attrs.items(), columns=['Attribute', 'Value'])
-        data = content.to_dataframe().sort_values(by='alt') if not only_global_attrs else None
-        data = data.reset_index() if data is not None else None  # Reset index to have a clean DataFrame
-        variables_attrs = pd.DataFrame([
-            {**var.attrs, 'variable': var_name} 
-            for var_name, var in content.data_vars.items()
-        ]) if not only_global_attrs else None
+        self.cache_dir = None  # set to a folder to enable the on-disk cache of decoded GDPs
+        self.cache_max_bytes = 2 * 1024**3
+        self._cache = None
+        self.remote_cache_dir = None  # set to a folder to keep the remote (ftp://) files read on disk
+        self.remote_cache_max_bytes = 2 * 1024**3
+        self.remote_pin_after = None
+        self._remote_cache = None
+
+    def _settings(self):
+        # reader settings shipped to the workers of read_many and dataset_builder
+        return {name: getattr(self, name) for name in [
+            'cache_dir', 'cache_max_bytes', 'remote_cache_dir', 'remote_cache_max_bytes', 'remote_pin_after'
+        ]}
+
+    def read(self, file_path, only_global_attrs=False, variables=None, alt_min=None, alt_max=None, use_cache=True, compact=False):
+        """
+        Read a GDP NetCDF file, given its path, its URL (ftp://host/path/file.nc) or its content (bytes or binary file object).
+        Remote files go through the remote cache when remote_cache_dir is set, otherwise they are read in memory.
+        variables (list): decode only these variables (and coordinates), 'alt' is always kept.
+        alt_min, alt_max (float): decode only the levels within this altitude window.
+        use_cache (bool): go through the on-disk cache when cache_dir is set.
+        compact (bool): drop the coordinates not requested (all but time and alt) and downcast
+            the data, see GD.compact. Use GD.upcast where float64 precision is needed.
+        """
+        if is_remote(file_path):
+            remote_cache = self.remote_cache()
+            file_path = remote_cache.get(file_path) if remote_cache is not None else fetch_url(file_path)
+        cache = self._get_cache() if use_cache and isinstance(file_path, (str, os.PathLike)) else None
+        if cache is not None:
+            gdp = self._read_cached(cache, file_path, only_global_attrs, variables, alt_min, alt_max)
+        else:
+            gdp = self._read_netcdf(file_path, only_global_attrs, variables, alt_min, alt_max)
+        if compact and gdp.data is not None:
+            keep = set(gdp.variables_attrs['variable']) | set(variables or []) | {'time', 'alt'}
+            gdp.data = gdp.data[[c for c in gdp.data.columns if c in keep]]
+            gdp.compact()
+        return gdp
+
+    def _get_cache(self):
+        if self.cache_dir is None:
+            return None
+        if self._cache is None or (self._cache.cache_dir, self._cache.max_bytes) != (self.cache_dir, self.cache_max_bytes):
+            self._cache = GDPCache(self.cache_dir, self.cache_max_bytes)
+        return self._cache
+
+    def remote_cache(self):
+        """
+        Return the RemoteCache of the remote files (None if remote_cache_dir is not set), e.g. to pin profiles:
+        gp.remote_cache().pin('ftp://host/path/file.nc')
+        """
+        if self.remote_cache_dir is None:
+            return None
+        settings = (self.remote_cache_dir, self.remote_cache_max_bytes, self.remote_pin_after)
+        if self._remote_cache is None or (self._remote_cache.cache_dir, self._remote_cache.max_bytes, self._remote_cache.pin_after) != settings:
+            self._remote_cache = RemoteCache(*settings)
+        return self._remote_cache
+
+    def _read_cached(self, cache, file_path, only_global_attrs=False, variables=None, alt_min=None, alt_max=None):
+        # the cache always holds the full profile, projection and window are applied on the cached table
+        if only_global_attrs:
+            attrs = cache.get_attrs(file_path)
+            if attrs is None:
+                return self._read_netcdf(file_path, only_global_attrs=True)
+            return GDP(attrs[0], None, None)
+        columns = None if variables is None else {'time', 'alt', *variables}
+        entry = cache.get(file_path, columns)
+        if entry is None:
+            # the entry may be evicted as soon as it is stored, keep working on the decoded GDP
+            gdp = self._read_netcdf(file_path)
+            cache.put(file_path, gdp)
+            data = gdp.data if columns is None else gdp.data[[c for c in gdp.data.columns if c in columns]]
+            entry = gdp.global_attrs, data, gdp.variables_attrs
+        global_attrs, data, variables_attrs = entry
+        if variables is not None:
+            missing = set(variables) - set(data.columns)
+            if missing:
+                raise KeyError(f"Variables not found in GDP: {sorted(missing)}")
+            variables_attrs = variables_attrs[variables_attrs['variable'].isin(columns)].reset_index(drop=True)
+        if alt_min is not None or alt_max is not None:
+            alt = data['alt'].values  # cached data is already sorted by alt
+            start = 0 if alt_min is None else np.searchsorted(alt, alt_min, side='left')
+            stop = len(alt) if alt_max is None else np.searchsorted(alt, alt_max, side='right')
+            data = data.iloc[start:stop].reset_index(drop=True)
+        return GDP(global_attrs, data, variables_attrs)
+
+    def _read_netcdf(self, file_path, only_global_attrs=False, variables=None, alt_min=None, alt_max=None):
+        with _netcdf_lock, _open_dataset(file_path) as content:
+            global_attrs=pd.DataFrame(content.attrs.items(), columns=['Attribute', 'Value'])
+            if only_global_attrs:
+                return GDP(global_attrs, None, None)
+            if variables is not None:
+                content = self._select_variables(content, variables)
+            content, is_sorted = self._select_altitude(content, alt_min, alt_max)
+            data = content.to_dataframe()
+            data = data if is_sorted else data.sort_values(by='alt')
+            data = data.reset_index()  # Reset index to have a clean DataFrame
+            variables_attrs = pd.DataFrame([
+                {**var.attrs, 'variable': var_name}
+                for var_name, var in content.data_vars.items()
+            ])
         gdp=GDP(global_attrs, data, variables_attrs)
         return gdp
 
+    def read_many(self, paths_or_folder, workers=None, executor='process', ordered=True, prefetch=None, **read_kwargs):
+        """
+        Read many GDP files in parallel and yield GDP objects one at a time.
+        paths_or_folder (str or list): a folder containing .nc files or a list of file paths.
+        workers (int): number of workers, defaults to the number of cores.
+        executor (str): 'process' (default) or 'thread'. The netCDF decoding is not thread-safe and is
+            serialized within a process, so only processes decode files in parallel.
+        ordered (bool): yield GDPs in input order, otherwise as soon as they are decoded.
+        prefetch (int): maximum number of files decoded ahead of the consumer, defaults to 2*workers.
+        read_kwargs: forwarded to read (variables, alt_min, alt_max, ...).
+        """
+        file_paths = self._list_files(paths_or_folder)
+        reader = partial(_read_file, read_kwargs=read_kwargs, settings=self._settings())
+        yield from bounded_map(reader, file_paths, workers, executor, ordered, prefetch)
+
+    def list_bundle(self, bundle_path, pattern='*.nc'):
+        """
+        Return the names of the GDP files packed in a zip or tar bundle.
+        """
+        return list_members(bundle_path, pattern)
+
+    def read_bundle(self, bundle_path, members=None, pattern='*.nc', workers=None, executor='process', ordered=True, prefetch=None, **read_kwargs):
+        """
+        Read the GDP files packed in a zip or tar bundle without unpacking it, and yield GDP objects one at a time.
+        Members are read in memory in archive order and decoded in parallel worker processes as in read_many.
+        members (list): names of the members to read (see list_bundle), defaults to all the members matching pattern.
+        """
+        reader = partial(_read_member, read_kwargs=read_kwargs, settings=self._settings())
+        yield from bounded_map(reader, iter_members(bundle_path, members, pattern), workers, executor, ordered, prefetch)
+
+    def stream_remote(self, ftp_dir_path, file_names=None, workers=None, executor='process', ordered=True, prefetch=None, save=False, **read_kwargs):
+        """
+        Download GDPs from the FTP server and yield them decoded, without going through the disk.
+        Files are downloaded into memory by threads over the pooled FTP connections (see fetch_many) and
+        decoded by worker processes as in read_bundle, so that the transfer of the next files overlaps
+        with the decoding of the previous ones and with the consumer of the GDPs.
+        Needs the FTP connection of DownloadManager, as in GRUANpy.
+        file_names (list): files to read, defaults to all the .nc files of ftp_dir_path.
+        workers (int): concurrent downloads and decodings, defaults to pool_size.
+        executor (str): executor of the decoding, see read_many.
+        prefetch (int): maximum number of files downloaded, and decoded, ahead of the consumer, defaults to 2*workers.
+        save (bool): also write the downloaded files to download_folder.
+        read_kwargs: forwarded to read (variables, alt_min, alt_max, compact, ...).
+        """
+        if file_names is None:
+            file_names = [name for name in self.search(ftp_dir_path) if name.endswith('.nc')]
+        workers = workers or self.pool_size
+        def fetched():
+            for file_name, content in self.fetch_many(ftp_dir_path, file_names, workers, ordered, prefetch):
+                if save:
+                    os.makedirs(self.download_folder, exist_ok=True)
+                    local_file_path = os.path.join(self.download_folder, file_name)
+                    with open(local_file_path + '.part', 'wb') as f:
+                        f.write(content)
+                    os.replace(local_file_path + '.part', local_file_path)
+                yield file_name, content
+        reader = partial(_read_member, read_kwargs=read_kwargs, settings=self._settings())
+        yield from bounded_map(reader, fetched(), workers, executor, ordered, prefetch)
+
+    def read_archive(self, paths_or_folder, chunks=None, variables=None, parallel=False):
+        """
+        Lazily open many GDP files as one dask-backed xarray.Dataset with dimensions (profile, level).
+        Levels are kept in file order and shorter profiles are padded with NaN. The launch time time,
+        product_id, site, time_of_day and start_time are coordinates, the global attributes shared
+        by all the files are kept as attributes.
+        chunks (dict): dask chunks, e.g. {'profile': 100}, defaults to one chunk per file.
+        variables (list): open only these variables (and alt).
+        parallel (bool): open the files in parallel with dask.delayed.
+        Elementwise Formulas accept the resulting DataArrays and stay lazy,
+        see GriddingManager.spatial_gridding_archive for gridding.
+        """
+        try:
+            import dask  # noqa: F401
+        except ImportError:
+            raise ImportError("dask is required to read archives lazily (pip install dask)")
+        file_paths = self._list_files(paths_or_folder)
+        archive = xr.open_mfdataset(
+            file_paths, combine='nested', concat_dim='profile', join='outer',
+            preprocess=partial(_archive_profile, variables=variables),
+            data_vars='all', coords='all', compat='override', combine_attrs='drop_conflicts',
+            parallel=parallel, chunks={},
+        )
+        profile_coords = ['product_id', 'site', 'time_of_day', 'start_time']
+        archive = archive.assign_coords({c: archive[c].load() for c in profile_coords})  # small, keep in memory for selections
+        return archive.chunk(chunks) if chunks else archive
+
+    def catalog(self, db_path, paths_or_folder=None, from_attrs=False):
+        """
+        Open (or create) a SQLite catalog of GDP files, optionally indexing new files first.
+        See gruanpy.helpers.read.catalog.Catalog for the available queries.
+        """
+        catalog = Catalog(db_path, reader=self)
+        if paths_or_folder is not None:
+            catalog.update(paths_or_folder, from_attrs=from_attrs)
+        return catalog
+
+    def open_store(self, path, mode='r', columns=None):
+        """
+        Open a memory-mapped multi-profile GDP store, mode 'a' to create it or append to it.
+        See gruanpy.helpers.read.gdp_store.GDPStore.
+        """
+        return GDPStore(path, mode=mode, columns=columns)
+
+    def dataset_builder(self, store_path, upper_bound=None, workers=None, executor='process', **read_kwargs):
+        """
+        Return a DatasetBuilder that appends new GDP files to the store at store_path,
+        deduplicating on g.Product.Id and recording failures in a manifest.
+        upper_bound (float): keep only the levels up to upper_bound meters above ground.
+        read_kwargs: forwarded to read (variables, compact, ...).
+        Usage: gp.dataset_builder(path, upper_bound=6000).update(file_paths)
+        """
+        read_file = partial(_read_file, read_kwargs=read_kwargs, settings=self._settings())
+        return DatasetBuilder(store_path, read_file, upper_bound=upper_bound, workers=workers, executor=executor)
+
+    def _list_files(self, paths_or_folder, extension='.nc'):
+        if isinstance(paths_or_folder, (str, os.PathLike)):
+            if os.path.isdir(paths_or_folder):
+                return [
+                    os.path.join(paths_or_folder, f) for f in sorted(os.listdir(paths_or_folder))
+                    if f.endswith(extension)
+                ]
+            return [paths_or_folder]
+        return list(paths_or_folder)
+
+    def _select_variables(self, content, variables):
+        # keep the requested variables plus alt, drop every other non-index coordinate
+        keep = set(variables) | {'alt'}
+        missing = keep - set(content.variables)
+        if missing:
+            raise KeyError(f"Variables not found in GDP: {sorted(missing)}")
+        drop_coords = [c for c in content.coords if c not in keep and c not in content.dims]
+        content = content.drop_vars(drop_coords)
+        return content[[v for v in content.data_vars if v in keep]]
+
+    def _select_altitude(self, content, alt_min=None, alt_max=None):
+        # only alt is loaded here, the window is then applied lazily on the time dimension
+        alt = content['alt'].values
+        dim = content['alt'].dims[0]
+        is_sorted = bool(np.all(alt[1:] >= alt[:-1]))
+        if alt_min is None and alt_max is None:
+            return content, is_sorted
+        lower = -np.inf if alt_min is None else alt_min
+        upper = np.inf if alt_max is None else alt_max
+        if is_sorted:
+            start = np.searchsorted(alt, lower, side='left')
+            stop = np.searchsorted(alt, upper, side='right')
+            return content.isel({dim: slice(start, stop)}), is_sorted
+        mask = (alt >= lower) & (alt <= upper)
+        return content.isel({dim: np.flatnonzero(mask)}), is_sorted
+
     def read_cdm(self, file_path):
         _, ext = os.path.splitext(file_path)
         ext = ext.lower()
@@ -33,3 +326,13 @@ class ReadingManager:
             return gdp
         else:
             raise ValueError(f"Unsupported file extension: {ext}")
+
+    def read_cdm_stream(self, file_path, block_size=1 << 24, report_column='report_id'):
+        """
+        Stream a (possibly multi GB) CSV file downloaded from the CDS and yield one GDP per report (ascent).
+        Observed variables are pivoted into the GDP columns (temp, rh, press, ...), with uncertainties as <col>_uc,
+        and the report metadata become global attributes (g.Product.Id, g.Site.Name, g.Measurement.StartTime, ...).
+        block_size (int): bytes read at a time, memory stays bounded by one block plus one report.
+        """
+        for report in stream_cdm_reports(file_path, report_column, block_size):
+            yield cdm_report_to_gdp(report)
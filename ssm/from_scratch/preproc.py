@@ -18,7 +18,11 @@ def preprocess_profile(path, upper_bound=3000):
     # ---------------------------------------------------------
     # Load GRUAN GDP file
     # ---------------------------------------------------------
-    gdp = gp.read(path)
+    gdp = gp.read(path, variables=[
+        'vspeed', 'vspeed_uc', 'temp', 'temp_uc', 'press', 'press_uc',
+        'rh', 'rh_uc', 'wvmr_mass', 'wvmr_mass_uc', 'wzon', 'wzon_uc',
+        'wmeri', 'wmeri_uc', 'alt_uc'
+    ])
 
     # determine PBLH upper bound
     upper_bound = gp._find_upper_bound(
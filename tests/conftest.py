@@ -0,0 +1,92 @@
+"""
+Shared fixtures: small synthetic GDP files following the GRUAN naming and attribute conventions,
+and a local FTP server.
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+VARIABLES = ['press', 'temp', 'rh']
+
+def write_gdp(path, start, n_levels, seed=0, site='LIN'):
+    """
+    Write a synthetic GDP of n_levels 1 s levels launched at start, return its path.
+    """
+    rng = np.random.default_rng(seed)
+    alt = 100 + np.cumsum(np.abs(rng.normal(5, 0.5, n_levels)))
+    values = {
+        'press': 1013 * np.exp(-alt / 8000),
+        'temp': 288 - 0.0065 * alt + rng.normal(0, 0.1, n_levels),
+        'rh': 50 + rng.normal(0, 5, n_levels),
+    }
+    content = xr.Dataset(coords={
+        'time': ('time', pd.date_range(start, periods=n_levels, freq='1s')),
+        'alt': ('time', alt),
+    })
+    for name, value in values.items():
+        content[name] = ('time', value, {'units': 'x', 'long_name': name})
+        for suffix in ['_uc', '_uc_ucor', '_uc_scor', '_uc_tcor']:
+            content[name + suffix] = ('time', np.abs(rng.normal(0.2, 0.05, n_levels)), {'units': 'x'})
+    start = pd.Timestamp(start)
+    content.attrs = {
+        'g.Product.Id': f'{site}-RS-01_2_RS41-GDP_001_{start:%Y%m%dT%H%M%S}',
+        'g.Site.Name': site,
+        'g.Measurement.StartTime': start.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'g.Measurement.TimeOfDay': 'nighttime' if start.hour == 0 else 'daytime',
+        'g.Product.Code': 'RS41-GDP',
+        'g.Product.Version': '1',
+    }
+    content.to_netcdf(path)
+    return path
+
+@pytest.fixture(scope='session')
+def gdp_files(tmp_path_factory):
+    # six profiles of different lengths, two per day
+    folder = tmp_path_factory.mktemp('gdp')
+    paths = []
+    for i, n_levels in enumerate([2050, 1500, 2200, 800, 2000, 1900]):
+        start = pd.Timestamp('2024-01-01') + pd.Timedelta(hours=12 * i)
+        name = f'LIN-RS-01_2_RS41-GDP_001_{start:%Y%m%dT%H%M%S}_1-000-{i + 1:03d}.nc'
+        paths.append(write_gdp(os.path.join(folder, name), start, n_levels, seed=i))
+    return paths
+
+IDLE_TIMEOUT = 1  # seconds after which the FTP server closes an idle connection
+
+def start_ftp_server(root, mlsd=True):
+    """
+    Start an anonymous read-only FTP server on a free port serving root, in a thread.
+    Returns the server, its thread and the list of the commands it received.
+    mlsd (bool): support MLSD, otherwise clients fall back to NLST.
+    """
+    pytest.importorskip('pyftpdlib')
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+    commands = []
+    class Handler(FTPHandler):
+        timeout = IDLE_TIMEOUT
+        proto_cmds = {cmd: info for cmd, info in FTPHandler.proto_cmds.items() if mlsd or cmd != 'MLSD'}
+        def pre_process_command(self, line, cmd, arg):
+            commands.append(cmd)
+            return super().pre_process_command(line, cmd, arg)
+    Handler.authorizer = DummyAuthorizer()
+    Handler.authorizer.add_anonymous(str(root))
+    server = FTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'timeout': 0.05}, daemon=True)
+    thread.start()
+    return server, thread, commands
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    # server of tmp_path/root, with three small files in data
+    root = tmp_path / 'root'
+    (root / 'data').mkdir(parents=True)
+    for i in range(3):
+        (root / 'data' / f'file{i}.nc').write_bytes(bytes([i]) * 1000 * (i + 1))
+    server, thread, _ = start_ftp_server(root)
+    yield server.address[1], root
+    server.close_all()
+    thread.join()
@@ -0,0 +1,24 @@
+import os
+import shutil
+import pytest
+import gruanpy as gp
+
+@pytest.fixture
+def folder(gdp_files, tmp_path):
+    # the six GDPs and a second ascent id of the first one, with the same product id
+    for path in gdp_files:
+        shutil.copy(path, tmp_path)
+    shutil.copy(gdp_files[0], tmp_path / os.path.basename(gdp_files[0]).replace('-001.nc', '-009.nc'))
+    return tmp_path
+
+def test_query_needs_global_attributes(folder):
+    catalog = gp.catalog(str(folder / 'catalog.db'), str(folder))
+    assert len(catalog.query()) == 7
+    with pytest.raises(ValueError):
+        catalog.query(unique=True)
+    with pytest.raises(ValueError):
+        catalog.query(time_of_day='daytime')
+    catalog.update(str(folder), from_attrs=True)
+    assert len(catalog.query()) == 6
+    assert len(catalog.query(unique=False)) == 7
+    assert catalog.query(time_of_day='daytime')['start_time'].str.endswith('12:00:00').all()
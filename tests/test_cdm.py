@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import gruanpy as gp
+
+def write_cdm(path, n_reports=20, n_levels=100):
+    # long layout, the first reports have no radiosonde type and no uncertainty at all
+    rows = []
+    for r in range(n_reports):
+        start = pd.Timestamp('2024-01-01') + pd.Timedelta(hours=12 * r)
+        for level in range(n_levels):
+            for variable, value in [('air_temperature', 280 - 0.1 * level), ('relative_humidity', 50.0)]:
+                rows.append({
+                    'station_name': 'LIN', 'report_timestamp': f'{start}+00', 'report_id': 1000 + r,
+                    'actual_time': f'{start + pd.Timedelta(seconds=level)}+00', 'air_pressure': 1000 - level,
+                    'observed_variable': variable, 'observation_value': value,
+                    'uncertainty_value': 0.2 if r >= 10 and variable == 'air_temperature' else np.nan,
+                    'radiosonde_type': 'RS41' if r >= 10 else None,
+                })
+    with open(path, 'w') as f:
+        f.write('# CDS export\n')
+        pd.DataFrame(rows).to_csv(f, index=False)
+    return path
+
+def test_read_cdm_stream_missing_values(tmp_path):
+    path = write_cdm(tmp_path / 'cdm.csv')
+    gdps = list(gp.read_cdm_stream(str(path), block_size=1 << 16))
+    assert [gdp.attr('g.Product.Id') for gdp in gdps] == [str(1000 + r) for r in range(20)]
+    for r, gdp in enumerate(gdps):
+        assert len(gdp.data) == 100
+        assert gdp.data['rh_uc'].isna().all()
+        assert gdp.data['temp_uc'].isna().all() == (r < 10)
+    assert gdps[-1].attr('g.Instrument.Type') == 'RS41'
@@ -0,0 +1,69 @@
+import json
+import threading
+import pytest
+from gruanpy.helpers.download.cds import build_requests, request_path
+from gruanpy.helpers.download.download_manager import DownloadManager
+
+class FakeClient:
+    """
+    Stands for cdsapi.Client: writes every request to its target file and records it.
+    fail (set): months whose retrieval raises.
+    """
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def retrieve(self, dataset, request, target):
+        with self._lock:
+            self.calls.append(request)
+        if set(request['month']) & self.fail:
+            raise RuntimeError(f"request {request['month']} failed")
+        with open(target, 'w') as f:
+            json.dump([dataset, request], f)
+
+def months(requests):
+    return [(r['year'], r['month']) for r in requests]
+
+def retrieved(path):
+    with open(path) as f:
+        return json.load(f)[1]
+
+def test_month_chunks_cover_the_date_range():
+    requests = build_requests(['air_temperature'], '2023-12-15', '2024-02-10', sites=['LIN', 'NYA'])
+    assert months(requests) == [(['2023'], ['12']), (['2024'], ['01']), (['2024'], ['02'])]
+    assert requests[0]['day'] == [f'{d:02d}' for d in range(15, 32)]
+    assert requests[2]['day'] == [f'{d:02d}' for d in range(1, 10)]
+    assert all(r['station_name'] == ['LIN', 'NYA'] for r in requests)
+
+def test_site_chunks_and_extra_keys():
+    requests = build_requests(['air_temperature'], '2024-01-01', '2024-03-01', sites=['NYA', 'LIN'],
+                              chunk=['month', 'site'], data_format='csv')
+    assert [(r['month'], r['station_name']) for r in requests] == [
+        (['01'], ['NYA']), (['01'], ['LIN']), (['02'], ['NYA']), (['02'], ['LIN'])]
+    assert all(r['data_format'] == 'csv' for r in requests)
+    assert request_path('cds', 'gruan', requests[0]).endswith('.csv')
+
+def test_empty_range():
+    assert build_requests(['air_temperature'], '2024-02-01', '2024-01-01') == []
+
+def test_cds_request_reuses_retrieved_chunks(tmp_path):
+    dm = DownloadManager(download_folder=str(tmp_path))
+    client = FakeClient()
+    paths = dm.cds_request(['air_temperature'], '2024-01-01', '2024-03-01', client=client, data_format='csv')
+    assert len(client.calls) == 2
+    assert [retrieved(p)['month'] for p in paths] == [['01'], ['02']]
+
+    # a longer request only retrieves the new month
+    client.calls.clear()
+    paths = dm.cds_request(['air_temperature'], '2024-01-01', '2024-04-01', client=client, data_format='csv')
+    assert months(client.calls) == [(['2024'], ['03'])]
+    assert len(paths) == 3
+
+def test_cds_request_keeps_chunks_retrieved_before_an_error(tmp_path):
+    dm = DownloadManager(download_folder=str(tmp_path))
+    with pytest.raises(RuntimeError):
+        dm.cds_request(['air_temperature'], '2024-01-01', '2024-04-01', client=FakeClient(fail={'02'}))
+    client = FakeClient()
+    dm.cds_request(['air_temperature'], '2024-01-01', '2024-04-01', client=client)
+    assert months(client.calls) == [(['2024'], ['02'])]
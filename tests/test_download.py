@@ -0,0 +1,135 @@
+import json
+import os
+import pytest
+from gruanpy.helpers.download.download_manager import DownloadManager
+from conftest import start_ftp_server
+
+def manager(port, folder):
+    return DownloadManager(ftp_url='127.0.0.1', ftp_port=port, download_folder=str(folder), pool_size=2)
+
+def remote_stat(path):
+    return [os.path.getsize(path), int(os.path.getmtime(path))]
+
+def test_stale_partial_file_is_not_resumed(ftp_server, tmp_path):
+    # a .part left by an older version of the remote file, with or without its recorded stat
+    port, root = ftp_server
+    remote = root / 'data' / 'big.nc'
+    remote.write_bytes(b'B' * 5000)
+    local = tmp_path / 'local'
+    local.mkdir()
+    for stat in [None, [5000, remote_stat(remote)[1] - 3600]]:
+        (local / 'big.nc.part').write_bytes(b'A' * 3000)
+        if stat is not None:
+            (local / 'big.nc.part.stat').write_text(json.dumps(stat))
+        dm = manager(port, local)
+        with open(dm.download('data', 'big.nc', force=True), 'rb') as f:
+            assert f.read() == b'B' * 5000
+        assert not os.path.exists(local / 'big.nc.part.stat')
+        dm.close()
+
+def test_partial_file_of_same_version_is_resumed(ftp_server, tmp_path):
+    port, root = ftp_server
+    remote = root / 'data' / 'big.nc'
+    remote.write_bytes(b'B' * 5000)
+    local = tmp_path / 'local'
+    local.mkdir()
+    # distinct bytes show that the first 3000 were not transferred again
+    (local / 'big.nc.part').write_bytes(b'C' * 3000)
+    (local / 'big.nc.part.stat').write_text(json.dumps(remote_stat(remote)))
+    dm = manager(port, local)
+    path = dm.download('data', 'big.nc')
+    with open(path, 'rb') as f:
+        assert f.read() == b'C' * 3000 + b'B' * 2000
+    assert int(os.path.getmtime(path)) == remote_stat(remote)[1]
+    dm.close()
+
+@pytest.fixture
+def nlst_server(tmp_path):
+    # server without MLSD: 200 files and a sub-directory, with the commands it receives
+    root = tmp_path / 'root'
+    (root / 'd' / 'sub').mkdir(parents=True)
+    for i in range(200):
+        (root / 'd' / f'f{i}.nc').write_bytes(b'x' * (i + 1))
+    (root / 'd' / 'sub' / 'g.nc').write_bytes(b'y' * 10)
+    server, thread, commands = start_ftp_server(root, mlsd=False)
+    yield server.address[1], root, commands
+    server.close_all()
+    thread.join()
+
+def test_search_without_mlsd_sends_one_listing(nlst_server, tmp_path):
+    port, _, commands = nlst_server
+    dm = manager(port, tmp_path / 'local')
+    commands.clear()
+    names = dm.search('d')
+    assert names == sorted([f'f{i}.nc' for i in range(200)] + ['sub'])
+    assert commands.count('NLST') == 1
+    assert not {'SIZE', 'MDTM'} & set(commands) and commands.count('CWD') <= 2
+    dm.close()
+
+def test_download_without_mlsd_stats_only_its_files(nlst_server, tmp_path):
+    port, root, commands = nlst_server
+    dm = manager(port, tmp_path / 'local')
+    commands.clear()
+    results = dm.download_many('d', ['f1.nc', 'f9.nc'])
+    assert commands.count('SIZE') == 2 and commands.count('MDTM') == 2
+    for name, path in results.items():
+        with open(path, 'rb') as f:
+            assert f.read() == (root / 'd' / name).read_bytes()
+    dm.close()
+
+def test_walk_without_mlsd(nlst_server, tmp_path):
+    port, _, commands = nlst_server
+    dm = manager(port, tmp_path / 'local')
+    files = {(dir_path, name) for dir_path, name, _, _ in dm.walk('d')}
+    assert ('d/sub', 'g.nc') in files and ('d', 'sub') not in files and len(files) == 201
+    assert 'SIZE' not in commands
+    dm.close()
+
+@pytest.fixture
+def gdp_tree(tmp_path):
+    # GRUAN-named files of two sites over three days, one folder per site
+    root = tmp_path / 'root'
+    for site in ['LIN', 'NYA']:
+        (root / 'gruan' / site).mkdir(parents=True)
+        for day in [1, 2, 3]:
+            name = f'{site}-RS-01_2_RS41-GDP_001_202401{day:02d}T000000_1-000-001.nc'
+            (root / 'gruan' / site / name).write_bytes(site.encode() * 100 * day)
+    (root / 'gruan' / 'README.txt').write_bytes(b'not a GDP')
+    server, thread, commands = start_ftp_server(root)
+    yield server.address[1], root, commands
+    server.close_all()
+    thread.join()
+
+def test_mirror_filters_and_skips_up_to_date_files(gdp_tree, tmp_path):
+    port, root, commands = gdp_tree
+    dm = manager(port, tmp_path / 'local')
+    results = dm.mirror('gruan', since='2024-01-02', site='LIN')
+    assert sorted(results) == [f'LIN/LIN-RS-01_2_RS41-GDP_001_202401{day:02d}T000000_1-000-001.nc' for day in [2, 3]]
+    for relative, path in results.items():
+        assert path == os.path.join(dm.download_folder, 'LIN', os.path.basename(relative))
+        with open(path, 'rb') as f:
+            assert f.read() == (root / 'gruan' / relative).read_bytes()
+    assert commands.count('RETR') == 2
+
+    # a second run, also with a fresh listing, transfers nothing
+    commands.clear()
+    assert dm.mirror('gruan', since='2024-01-02', site='LIN', ttl=0) == results
+    assert 'RETR' not in commands
+    dm.close()
+
+def test_listings_are_cached(gdp_tree, tmp_path):
+    port, _, commands = gdp_tree
+    dm = manager(port, tmp_path / 'local')
+    dm.listing_cache_dir = str(tmp_path / 'listings')
+    assert dm.search('gruan') == ['LIN', 'NYA', 'README.txt']
+    dm.search('gruan')
+    assert commands.count('MLSD') == 1
+    dm.search('gruan', ttl=0)
+    assert commands.count('MLSD') == 2
+
+    # cached on disk for the next session
+    other = manager(port, tmp_path / 'local')
+    other.listing_cache_dir = dm.listing_cache_dir
+    assert other.search('gruan') == ['LIN', 'NYA', 'README.txt']
+    assert commands.count('MLSD') == 2
+    dm.close()
@@ -0,0 +1,78 @@
+import ftplib
+import os
+import threading
+import time
+import pytest
+from gruanpy.helpers.download.ftp_pool import FTPPool
+from gruanpy.helpers.download.download_manager import DownloadManager
+from conftest import IDLE_TIMEOUT
+
+def test_borrowed_connections_are_returned_and_reused(ftp_server):
+    port, _ = ftp_server
+    pool = FTPPool('127.0.0.1', port, size=2)
+    with pool.connection() as first, pool.connection() as second:
+        assert first is not second
+        assert pool._idle.empty()
+    assert pool._idle.qsize() == 2
+    with pool.connection() as ftp:
+        assert ftp in (first, second)
+    pool.close()
+
+def test_pool_size_bounds_the_open_connections(ftp_server):
+    port, _ = ftp_server
+    pool = FTPPool('127.0.0.1', port, size=1)
+    borrowed = threading.Event()
+    def borrow():
+        with pool.connection():
+            borrowed.set()
+    with pool.connection():
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        assert not borrowed.wait(0.3)  # waits for the only connection
+    thread.join(5)
+    assert borrowed.is_set()
+    pool.close()
+
+def test_connection_is_returned_to_login_directory(ftp_server):
+    port, _ = ftp_server
+    pool = FTPPool('127.0.0.1', port, size=1)
+    with pool.connection() as ftp:
+        home = ftp.pwd()
+        ftp.cwd('data')
+    with pool.connection() as ftp:
+        assert ftp.pwd() == home
+        assert 'data' in ftp.nlst()
+    pool.close()
+
+def test_stale_connection_is_replaced(ftp_server):
+    port, _ = ftp_server
+    pool = FTPPool('127.0.0.1', port, size=1)
+    with pool.connection() as stale:
+        pass
+    time.sleep(IDLE_TIMEOUT + 0.5)  # the server drops the idle connection
+    with pool.connection() as ftp:
+        assert ftp is not stale
+        assert ftp.voidcmd('NOOP').startswith('200')
+    pool.close()
+
+def test_permanent_error_keeps_the_connection(ftp_server):
+    port, _ = ftp_server
+    pool = FTPPool('127.0.0.1', port, size=1)
+    with pool.connection() as ftp:
+        pass
+    with pytest.raises(ftplib.error_perm):
+        pool.call(lambda ftp: ftp.cwd('missing'))
+    with pool.connection() as again:
+        assert again is ftp
+    pool.close()
+
+def test_download_many_reports_errors_per_file(ftp_server, tmp_path):
+    port, root = ftp_server
+    dm = DownloadManager(ftp_url='127.0.0.1', ftp_port=port, download_folder=str(tmp_path / 'local'), pool_size=2)
+    results = dm.download_many('data', ['file0.nc', 'missing.nc', 'file2.nc'], retries=0)
+    assert isinstance(results['missing.nc'], ftplib.error_perm)
+    for name in ['file0.nc', 'file2.nc']:
+        with open(results[name], 'rb') as f:
+            assert f.read() == (root / 'data' / name).read_bytes()
+    assert not os.path.exists(os.path.join(dm.download_folder, 'missing.nc'))
+    dm.close()
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import pytest
+import gruanpy as gp
+from gruanpy.helpers.read.gdp_store import GDPStore
+
+@pytest.fixture
+def store_path(gdp_files, tmp_path):
+    path = str(tmp_path / 'store')
+    gdps = [gp.read(f, use_cache=False) for f in gdp_files]
+    GDPStore.write(path, {f'{gdp.product_id}-{i}': gdp for i in range(5) for gdp in gdps})
+    return path
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc')
+def test_views_share_one_mapping_per_column(store_path):
+    store = gp.open_store(store_path)
+    before = open_fds()
+    views = store[0:30]
+    assert open_fds() - before <= len(store.schema)
+    assert len(views) == 30 and all(len(view.data) for view in views)
+
+def test_views_are_read_only_copies_are_not(store_path, gdp_files):
+    store = gp.open_store(store_path)
+    pid = store.product_ids[0]
+    view = store[pid]
+    with pytest.raises(ValueError):
+        view.data['temp'].to_numpy()[0] = 0
+    gdp = store.get(pid, copy=True)
+    gdp.data.loc[0, 'temp'] = 0
+    assert store[pid].data.loc[0, 'temp'] == gp.read(gdp_files[0], use_cache=False).data.loc[0, 'temp']
+
+def test_rows_appended_after_a_read(store_path, gdp_files):
+    store = GDPStore(store_path, mode='a')
+    first = store[0].data['temp'].to_numpy()
+    store.append(gp.read(gdp_files[1], use_cache=False), product_id='new')
+    np.testing.assert_array_equal(store['new'].data['temp'], gp.read(gdp_files[1], use_cache=False).data['temp'])
+    np.testing.assert_array_equal(store[0].data['temp'], first)
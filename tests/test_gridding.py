@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+import gruanpy as gp
+from conftest import write_gdp
+
+@pytest.mark.parametrize('mandatory_levels_flag', [True, False])
+def test_spatial_gridding_archive_matches_many(gdp_files, mandatory_levels_flag):
+    # profiles of different lengths leave the level dimension of the archive in several chunks
+    archive = gp.read_archive(gdp_files)
+    assert len(archive.chunks['level']) > 1
+    gridded = gp.spatial_gridding_archive(archive, 'alt', ['temp'], 500, mandatory_levels_flag).compute()
+    expected = gp.spatial_gridding_many([gp.read(f) for f in gdp_files], 'alt', ['temp'], 500, mandatory_levels_flag, as_table=True)
+    key = 'mand_lvl' if mandatory_levels_flag else 'alt_bin'
+    for i in range(len(gdp_files)):
+        rows = expected[expected['profile'] == i]
+        profile = gridded.isel(profile=i)
+        assert np.isfinite(profile['temp'].values).sum() == len(rows)
+        for name in ['temp', 'temp_uc', 'alt']:
+            np.testing.assert_allclose(profile[name].sel(bin=rows[key].values).values, rows[name].values)
+
+@pytest.fixture(scope='module')
+def two_months(tmp_path_factory):
+    # two sites, profiles in January and February
+    folder = tmp_path_factory.mktemp('archive')
+    paths = []
+    for i, start in enumerate(pd.date_range('2024-01-20', periods=8, freq='5D')):
+        site = ['LIN', 'NYA'][i % 2]
+        name = f'{site}-RS-01_2_RS41-GDP_001_{start:%Y%m%dT%H%M%S}_1-000-{i + 1:03d}.nc'
+        paths.append(write_gdp(os.path.join(folder, name), start, 1000 + 100 * i, seed=i, site=site))
+    return paths
+
+@pytest.mark.parametrize('scheduler', [None, 'threads'])
+def test_grid_archive_matches_temporal_gridding(two_months, scheduler):
+    pytest.importorskip('dask')
+    gridded = gp.grid_archive(two_months, 'alt', ['temp'], 'month', bin_size=500, mandatory_levels_flag=False,
+                              scheduler=scheduler, split_every=2)
+    ggds = gp.spatial_gridding_many(gp.read_many(two_months), 'alt', ['temp'], 500, mandatory_levels_flag=False)
+    expected = gp.temporal_gridding(ggds, ['temp'], 'month', lvl_column='alt_bin')
+    keys = ['time_bin', 'alt_bin']
+    result = gridded.data.sort_values(keys).reset_index(drop=True)
+    expected = expected.data.sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+
+def test_spatial_gridding_archive_without_press(gdp_files, tmp_path):
+    # regular altitude bins need no pressure, and keep the rows whose pressure is missing
+    with xr.open_dataset(gdp_files[0]) as content:
+        content = content.load()
+    content['press'][:300] = np.nan
+    paths = [str(tmp_path / os.path.basename(gdp_files[0]))] + gdp_files[1:3]
+    content.to_netcdf(paths[0])
+    expected = gp.spatial_gridding_many([gp.read(f) for f in paths], 'alt', ['temp'], 500, False, as_table=True)
+    for variables in [None, ['temp', 'temp_uc_ucor']]:
+        gridded = gp.spatial_gridding_archive(gp.read_archive(paths, variables=variables), 'alt', ['temp'], 500, False).compute()
+        for i in range(len(paths)):
+            rows = expected[expected['profile'] == i]
+            np.testing.assert_allclose(gridded['temp'].isel(profile=i).sel(bin=rows['alt_bin'].values).values, rows['temp'].values)
+    with pytest.raises(KeyError, match='press'):
+        gp.spatial_gridding_archive(gp.read_archive(paths, variables=['temp']), 'alt', ['temp'], 500, True)
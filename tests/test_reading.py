@@ -0,0 +1,29 @@
+import os
+import shutil
+import pandas as pd
+import gruanpy as gp
+
+def test_read_through_cache_smaller_than_profile(gdp_files, tmp_path, monkeypatch):
+    # every entry is evicted as soon as it is stored
+    monkeypatch.setattr(gp, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(gp, 'cache_max_bytes', 1000)
+    gdp = gp.read(gdp_files[0], variables=['temp'], alt_min=1000, alt_max=5000)
+    expected = gp.read(gdp_files[0], variables=['temp'], alt_min=1000, alt_max=5000, use_cache=False)
+    pd.testing.assert_frame_equal(gdp.data, expected.data[gdp.data.columns], check_dtype=False)
+    assert gp._get_cache().size() <= 1000
+
+def test_stream_remote_decodes_in_memory(ftp_server, gdp_files, tmp_path, monkeypatch):
+    port, root = ftp_server
+    for path in gdp_files[:4]:
+        shutil.copy(path, root / 'data')
+    monkeypatch.setattr(gp, 'ftp_url', '127.0.0.1')
+    monkeypatch.setattr(gp, 'ftp_port', port)
+    monkeypatch.setattr(gp, 'download_folder', str(tmp_path / 'local'))
+    names = sorted(os.path.basename(path) for path in gdp_files[:4])
+    try:
+        gdps = list(gp.stream_remote('data', names, workers=2))
+    finally:
+        gp.close()
+    assert [gdp.product_id for gdp in gdps] == [gp.read(path, use_cache=False).product_id for path in sorted(gdp_files[:4])]
+    assert all(len(gdp.data) for gdp in gdps)
+    assert not os.path.exists(gp.download_folder)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import gruanpy as gp
+from gruanpy.helpers.download.remote_cache import RemoteCache
+
+class Fetcher:
+    # fake remote: the content of a URL is 1000 bytes of its last character
+    def __init__(self):
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        return url[-1].encode() * 1000
+
+def urls(*names):
+    return [f'ftp://host/data/{name}' for name in names]
+
+def test_miss_then_hit(tmp_path):
+    fetch = Fetcher()
+    cache = RemoteCache(str(tmp_path), fetch=fetch)
+    url, = urls('a')
+    path = cache.get(url)
+    assert open(path, 'rb').read() == b'a' * 1000
+    assert cache.get(url) == path
+    assert fetch.urls == [url]
+    assert url in cache
+
+def test_least_recently_used_are_evicted(tmp_path):
+    fetch = Fetcher()
+    cache = RemoteCache(str(tmp_path), max_bytes=2500, fetch=fetch)
+    a, b, c = urls('a', 'b', 'c')
+    for url in [a, b]:
+        cache.get(url)
+    os.utime(cache.path(a), (0, 0))  # least recently used
+    cache.get(c)
+    assert a not in cache and b in cache and c in cache
+    assert cache.size() <= 2500
+
+def test_pinned_files_are_kept(tmp_path):
+    fetch = Fetcher()
+    cache = RemoteCache(str(tmp_path), max_bytes=500, pin_after=2, fetch=fetch)
+    a, b, c = urls('a', 'b', 'c')
+    cache.pin(a)
+    for _ in range(3):
+        cache.get(b)  # a miss, then the second hit pins b
+    assert sorted(cache.pinned) == [a, b]
+    cache.get(c)
+    cache.evict()  # the budget only applies to the unpinned files
+    assert a in cache and b in cache and c not in cache
+    cache.unpin(a)
+    assert a not in cache
+
+def test_budget_smaller_than_a_file(tmp_path):
+    fetch = Fetcher()
+    cache = RemoteCache(str(tmp_path), max_bytes=100, fetch=fetch)
+    a, b = urls('a', 'b')
+    path = cache.get(a)
+    assert open(path, 'rb').read() == b'a' * 1000
+    cache.get(b)  # the previous file is evicted, the new one is returned
+    assert a not in cache and b in cache
+
+def test_read_remote_gdp_through_small_cache(ftp_server, gdp_files, tmp_path, monkeypatch):
+    port, root = ftp_server
+    shutil.copy(gdp_files[0], root / 'data')
+    monkeypatch.setattr(gp, 'remote_cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(gp, 'remote_cache_max_bytes', 1000)
+    gdp = gp.read(f'ftp://127.0.0.1:{port}/data/{os.path.basename(gdp_files[0])}', use_cache=False)
+    assert len(gdp.data) == len(gp.read(gdp_files[0], use_cache=False).data)
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+import pytest
+from gruanpy.helpers.grid.statistics import sufficient_statistics
+
+@pytest.fixture
+def rows():
+    # values and keys with missing entries, one group made of missing values only
+    rng = np.random.default_rng(0)
+    n = 5000
+    data = pd.DataFrame({'temp': rng.normal(250, 20, n), 'rh': rng.normal(50, 10, n)})
+    data.loc[rng.random(n) < 0.1, 'temp'] = np.nan
+    profile = rng.integers(0, 5, n).astype(float)
+    level = rng.integers(0, 30, n).astype(float)
+    level[rng.random(n) < 0.05] = np.nan
+    data.loc[level == 29, 'rh'] = np.nan
+    return data, {'profile': profile, 'lvl': level}
+
+@pytest.mark.parametrize('backend', ['arrow', 'polars'])
+def test_backends_match_pandas(rows, backend):
+    pytest.importorskip({'arrow': 'pyarrow', 'polars': 'polars'}[backend])
+    data, keys = rows
+    expected = sufficient_statistics(data, keys, ['temp', 'rh'], 'pandas')
+    stats = sufficient_statistics(data, keys, ['temp', 'rh'], backend)
+    pd.testing.assert_frame_equal(stats[expected.columns], expected, check_dtype=False, check_index_type=False, rtol=1e-9)